@@ -1,10 +1,19 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from bedrock_client import BedrockClient
 from local_db import LocalDatabase
+from cohort_planner import CohortPlanner
+from protocol_chunker import REQUIREMENT_KEYS, format_requirements, merge_requirement_sets, requirement_delta
 
 class AIMentor:
     def __init__(self):
         self.bedrock = BedrockClient()
         self.db = LocalDatabase()
+        # Upper bound on in-flight Bedrock calls during protocol analysis
+        self.max_workers = int(os.getenv('ANALYSIS_MAX_WORKERS', '8'))
+        # One model call per (role, department) cohort instead of per user
+        self.analyze_by_cohort = os.getenv('ANALYSIS_BY_COHORT', '1') != '0'
+        self.cohort_planner = CohortPlanner(self.db)
     
     def analyze_and_assign(self, protocol_text: str, user_id: str):
         # Get user data
@@ -22,6 +31,7 @@ class AIMentor:
         
         # Analyze through AI
         decision = self.bedrock.analyze_protocol(protocol_text, user_data, courses)
+        self.bedrock.decision_cache.flush()
         
         result = {
             "user_id": user_id,
@@ -84,10 +94,15 @@ class AIMentor:
                     "reason": decision.get("reason", "")
                 })
         
+        self.bedrock.decision_cache.flush()
         return results
     
-    def analyze_for_all_users_with_history(self, protocol_text: str, doc_tracker):
-        all_users = self.db.get_all_users()[:10]  # Only first 10 for demo
+    def analyze_for_all_users_with_history(self, protocol_text: str, doc_tracker, max_workers: int = None, by_cohort: bool = None, use_cache: bool = True,
+                                           completed_users: dict = None, on_user_done=None, on_phase=None, summary: dict = None):
+        """completed_users holds per-user outcomes checkpointed by an earlier run; on_user_done(user_id, outcome, done, total) checkpoints new ones"""
+        all_users = self.db.get_all_users()
+        completed_users = completed_users or {}
+        pending_ids = {u['user_id'] for u in all_users if u['user_id'] not in completed_users}
         courses = self.db.get_all_courses()
         
         results = {
@@ -97,116 +112,205 @@ class AIMentor:
             "skipped_duplicates": []
         }
         
-        for i, user in enumerate(all_users):
-            user_id = user['user_id']
-            completed_courses = self.db.get_user_courses(user_id)
-            user_data = dict(user)
-            user_data['completed_courses'] = completed_courses
-            
-            # AI analysis for each user
-            decision = self.bedrock.analyze_protocol(protocol_text, user_data, courses)
-            
-            assignments_made = []
-            skipped_courses = []
-            
-            if decision.get("should_assign") and decision.get("recommended_courses"):
-                for course_item in decision["recommended_courses"]:
-                    # Support both formats
-                    if isinstance(course_item, str):
-                        course_id = course_item
-                        priority = "normal"
-                        renewal_months = 12
-                        deadline_days = 30
-                    else:
-                        course_id = course_item.get("course_id", course_item)
-                        priority = course_item.get("priority", "normal")
-                        renewal_months = course_item.get("renewal_months", 12)
-                        deadline_days = course_item.get("deadline_days", 30)
-                    
-                    existing_db = self.db.get_assignment_history(user_id, course_id)
-                    existing_tracker = doc_tracker.has_recent_assignment(user_id, course_id)
-                    all_user_courses = doc_tracker.get_all_user_courses(user_id)
-                    course_expired = hasattr(self, '_scheduler') and self._scheduler.should_reassign_course(user_id, course_id, doc_tracker)
-                    
-                    if (existing_db or existing_tracker or course_id in all_user_courses) and not course_expired:
-                        skipped_courses.append(course_id)
-                    else:
-                        self.db.assign_course(user_id, course_id)
-                        assignments_made.append(course_id)
-                        if course_expired:
-                            assignments_made[-1] = f"{course_id} (update)"
-                    
-                    # Save AI-determined parameters
-                    if hasattr(self, '_scheduler'):
-                        self._scheduler.course_periods[course_id] = renewal_months
-                        if not hasattr(self._scheduler, 'course_deadlines'):
-                            self._scheduler.course_deadlines = {}
-                        if not hasattr(self._scheduler, 'course_priorities'):
-                            self._scheduler.course_priorities = {}
-                        self._scheduler.course_deadlines[course_id] = deadline_days
-                        self._scheduler.course_priorities[course_id] = priority
-            
-            if assignments_made:  # Only if there are new assignments
-                # Collect period information
-                course_periods = []
-                if hasattr(self, '_scheduler'):
-                    for course_id in assignments_made:
-                        clean_course_id = course_id.replace(" (update)", "")
-                        if clean_course_id in self._scheduler.course_periods:
-                            course_periods.append({
-                                "course_id": clean_course_id,
-                                "priority": getattr(self._scheduler, 'course_priorities', {}).get(clean_course_id, "normal"),
-                                "months": self._scheduler.course_periods[clean_course_id],
-                                "deadline_days": getattr(self._scheduler, 'course_deadlines', {}).get(clean_course_id, 30)
-                            })
+        if by_cohort is None:
+            by_cohort = self.analyze_by_cohort
+        
+        # Whole document is chunked and summarized once, every decision reuses it
+        if summary is None:
+            if on_phase:
+                on_phase("summarizing")
+            summary = self.bedrock.summarize_protocol(protocol_text, use_cache)
+        results["sections_analyzed"] = summary["sections"]
+        results["requirements"] = {key: summary.get(key, []) for key in REQUIREMENT_KEYS}
+        
+        # AI analysis runs concurrently, decisions come back in user order
+        if on_phase:
+            on_phase("analyzing")
+        if by_cohort:
+            # Cohorts are planned over everyone so resumed runs hit the decision cache
+            cohorts = [c for c in self.cohort_planner.plan(all_users) if any(u['user_id'] in pending_ids for u in c["users"])]
+            subjects = [self.cohort_planner.cohort_user_data(c) for c in cohorts]
+            cohort_decisions = self._analyze_concurrently(protocol_text, subjects, courses, max_workers, use_cache, summary)
+            decision_by_user = {}
+            for cohort, decision in zip(cohorts, cohort_decisions):
+                for user in cohort["users"]:
+                    decision_by_user[user['user_id']] = decision
+            results["cohorts_analyzed"] = len(cohorts)
+        else:
+            pending_users = [u for u in all_users if u['user_id'] in pending_ids]
+            decisions = self._analyze_concurrently(protocol_text, [self._build_user_data(u) for u in pending_users], courses, max_workers, use_cache, summary)
+            decision_by_user = {u['user_id']: d for u, d in zip(pending_users, decisions)}
+        # Decisions and the summary are cached in memory during the run and written once
+        self.bedrock.decision_cache.flush()
+        
+        # Duplicate and expiry checks stay sequential - they mutate db and scheduler state
+        if on_phase:
+            on_phase("applying")
+        for done, user in enumerate(all_users, 1):
+            outcome = completed_users.get(user['user_id'])
+            if outcome is None:
+                assignments_before, skipped_before = len(results["assignments"]), len(results["skipped_duplicates"])
+                self._apply_decision_with_history(user, decision_by_user[user['user_id']], doc_tracker, results)
+                outcome = {
+                    "assignment": results["assignments"][assignments_before] if len(results["assignments"]) > assignments_before else None,
+                    "skipped": results["skipped_duplicates"][skipped_before] if len(results["skipped_duplicates"]) > skipped_before else None
+                }
+                if on_user_done:
+                    on_user_done(user['user_id'], outcome, done, len(all_users))
+            else:
+                # Applied before a restart, only the outcome is merged back
+                if outcome.get("assignment"):
+                    results["assignments"].append(outcome["assignment"])
+                if outcome.get("skipped"):
+                    results["skipped_duplicates"].append(outcome["skipped"])
+        
+        return results
+    
+    def analyze_revision(self, changed_text: str, known_requirements: dict, doc_tracker, use_cache: bool = True, on_phase=None, **kwargs):
+        """Revised protocol: only changed sections are extracted, decisions are made on requirements the prior version lacked"""
+        if on_phase:
+            on_phase("summarizing")
+        extracted = self.bedrock.summarize_protocol(changed_text, use_cache)
+        new_requirements = requirement_delta(known_requirements, extracted)
+        
+        if any(new_requirements.values()):
+            delta_text = format_requirements(new_requirements, "Revision of an already processed protocol. Requirements added by this revision:")
+            summary = {"text": delta_text, "sections": extracted["sections"]}
+            results = self.analyze_for_all_users_with_history(delta_text, doc_tracker, use_cache=use_cache, on_phase=on_phase, summary=summary, **kwargs)
+        else:
+            # Wording or date changes only, nobody is affected
+            results = {
+                "protocol_summary": changed_text[:200] + "...",
+                "total_users": len(self.db.get_all_users()),
+                "assignments": [],
+                "skipped_duplicates": [],
+                "sections_analyzed": extracted["sections"]
+            }
+        
+        results["requirements"] = merge_requirement_sets(known_requirements, extracted)
+        results["new_requirements"] = new_requirements
+        self.bedrock.decision_cache.flush()
+        return results
+    
+    def _build_user_data(self, user: dict) -> dict:
+        """User record plus completed courses, as expected by analyze_protocol"""
+        user_data = dict(user)
+        user_data['completed_courses'] = self.db.get_user_courses(user['user_id'])
+        return user_data
+    
+    def _analyze_concurrently(self, protocol_text: str, subjects: list, courses: list, max_workers: int = None, use_cache: bool = True, summary: dict = None) -> list:
+        """Runs AI analysis for each user/cohort on a bounded pool, results in input order"""
+        if not subjects:
+            return []
+        
+        workers = max(1, min(max_workers or self.max_workers, len(subjects)))
+        
+        # Several users per call: the protocol and catalog are sent once per batch
+        if self.bedrock.max_batch_size > 1 and len(subjects) > 1:
+            return self.bedrock.analyze_protocol_batch(protocol_text, subjects, courses, use_cache, summary, workers)
+        
+        def analyze(user_data):
+            return self.bedrock.analyze_protocol(protocol_text, user_data, courses, use_cache, summary)
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-analysis") as executor:
+            return list(executor.map(analyze, subjects))
+    
+    def _apply_decision_with_history(self, user: dict, decision: dict, doc_tracker, results: dict):
+        """Applies one user's AI decision, skipping duplicates and reassigning expired courses"""
+        user_id = user['user_id']
+        assignments_made = []
+        skipped_courses = []
+        # Completed or previously assigned courses, checked locally per user
+        covered_courses = self.cohort_planner.covered_courses(user_id, doc_tracker)
+        
+        if decision.get("should_assign") and decision.get("recommended_courses"):
+            for course_item in decision["recommended_courses"]:
+                # Support both formats
+                if isinstance(course_item, str):
+                    course_id = course_item
+                    priority = "normal"
+                    renewal_months = 12
+                    deadline_days = 30
+                else:
+                    course_id = course_item.get("course_id", course_item)
+                    priority = course_item.get("priority", "normal")
+                    renewal_months = course_item.get("renewal_months", 12)
+                    deadline_days = course_item.get("deadline_days", 30)
                 
-                results["assignments"].append({
-                    "user_id": user_id,
-                    "name": user['name'],
-                    "role": user['role'],
-                    "department": user['department'],
-                    "courses_assigned": assignments_made,
-                    "reason": decision.get("reason", ""),
-                    "course_periods": course_periods
-                })
+                course_expired = hasattr(self, '_scheduler') and self._scheduler.should_reassign_course(user_id, course_id, doc_tracker)
+                
+                if course_id in covered_courses and not course_expired:
+                    skipped_courses.append(course_id)
+                else:
+                    self.db.assign_course(user_id, course_id)
+                    covered_courses.add(course_id)
+                    assignments_made.append(course_id)
+                    if course_expired:
+                        assignments_made[-1] = f"{course_id} (update)"
+                
+                # Save AI-determined parameters
+                if hasattr(self, '_scheduler'):
+                    self._scheduler.course_periods[course_id] = renewal_months
+                    if not hasattr(self._scheduler, 'course_deadlines'):
+                        self._scheduler.course_deadlines = {}
+                    if not hasattr(self._scheduler, 'course_priorities'):
+                        self._scheduler.course_priorities = {}
+                    self._scheduler.course_deadlines[course_id] = deadline_days
+                    self._scheduler.course_priorities[course_id] = priority
+        
+        if assignments_made:  # Only if there are new assignments
+            # Collect period information
+            course_periods = []
+            if hasattr(self, '_scheduler'):
+                for course_id in assignments_made:
+                    clean_course_id = course_id.replace(" (update)", "")
+                    if clean_course_id in self._scheduler.course_periods:
+                        course_periods.append({
+                            "course_id": clean_course_id,
+                            "priority": getattr(self._scheduler, 'course_priorities', {}).get(clean_course_id, "normal"),
+                            "months": self._scheduler.course_periods[clean_course_id],
+                            "deadline_days": getattr(self._scheduler, 'course_deadlines', {}).get(clean_course_id, 30)
+                        })
             
-            if skipped_courses:  # If there are skipped courses
-                results["skipped_duplicates"].append({
-                    "user_id": user_id,
-                    "name": user['name'],
-                    "skipped_courses": skipped_courses,
-                    "reason": "Courses were already assigned previously"
-                })
+            results["assignments"].append({
+                "user_id": user_id,
+                "name": user['name'],
+                "role": user['role'],
+                "department": user['department'],
+                "courses_assigned": assignments_made,
+                "reason": decision.get("reason", ""),
+                "course_periods": course_periods
+            })
         
-        return results
+        if skipped_courses:  # If there are skipped courses
+            results["skipped_duplicates"].append({
+                "user_id": user_id,
+                "name": user['name'],
+                "skipped_courses": skipped_courses,
+                "reason": "Courses were already assigned previously"
+            })
     
     def chat(self, message: str, user_id: str = None) -> dict:
         """Smart chat with conversation memory"""
         try:
-            # Get user context
-            user_context = ""
-            if user_id:
-                user = self.db.get_user(user_id)
-                if user:
-                    user_context = f"User: {user['name']} ({user['role']}) from {user['department']}"
+            system_prompt = self._build_chat_system_prompt(user_id)
+            response = self.bedrock.chat(message, system_prompt)
             
-            # Get conversation history
-            chat_history = self._get_chat_history(user_id) if user_id else []
-            history_context = self._format_history(chat_history)
+            # Save conversation to memory
+            if user_id:
+                self._save_to_history(user_id, message, response)
             
-            # Create enhanced system prompt with memory
-            system_prompt = f"""You are a helpful Random Coffee assistant for Cal Poly students.
-You help with safety questions, workplace guidance, and campus information.
-{user_context}
-
-CONVERSATION HISTORY:
-{history_context}
-
-Be friendly, helpful, and remember the conversation context. If the user asks for elaboration or says "yes please", continue the previous topic."""
+            return {"response": response}
             
-            response = self.bedrock.chat(message, system_prompt)
+        except Exception as e:
+            return {"response": f"I'm here to help! Ask me about safety, workplace procedures, or campus life. (Error: {str(e)[:50]}...)"}
+    
+    async def achat(self, message: str, user_id: str = None) -> dict:
+        """Same as chat, but awaits Bedrock without blocking the event loop"""
+        try:
+            system_prompt = self._build_chat_system_prompt(user_id)
+            response = await self.bedrock.achat(message, system_prompt)
             
-            # Save conversation to memory
             if user_id:
                 self._save_to_history(user_id, message, response)
             
@@ -215,6 +319,46 @@ Be friendly, helpful, and remember the conversation context. If the user asks fo
         except Exception as e:
             return {"response": f"I'm here to help! Ask me about safety, workplace procedures, or campus life. (Error: {str(e)[:50]}...)"}
     
+    def stream_chat(self, message: str, user_id: str = None):
+        """Same as chat, but yields the response token by token; history is saved once the stream ends"""
+        parts = []
+        try:
+            system_prompt = self._build_chat_system_prompt(user_id)
+            for token in self.bedrock.stream_chat_messages([{"role": "user", "content": message}], system_prompt, temperature=0.7):
+                parts.append(token)
+                yield token
+        except Exception as e:
+            if not parts:
+                fallback = f"I'm here to help! Ask me about safety, workplace procedures, or campus life. (Error: {str(e)[:50]}...)"
+                parts.append(fallback)
+                yield fallback
+        
+        if user_id and parts:
+            self._save_to_history(user_id, message, "".join(parts))
+    
+    def _build_chat_system_prompt(self, user_id: str = None) -> str:
+        """System prompt with user context and recent conversation"""
+        # Get user context
+        user_context = ""
+        if user_id:
+            user = self.db.get_user(user_id)
+            if user:
+                user_context = f"User: {user['name']} ({user['role']}) from {user['department']}"
+        
+        # Get conversation history
+        chat_history = self._get_chat_history(user_id) if user_id else []
+        history_context = self._format_history(chat_history)
+        
+        # Create enhanced system prompt with memory
+        return f"""You are a helpful Random Coffee assistant for Cal Poly students.
+You help with safety questions, workplace guidance, and campus information.
+{user_context}
+
+CONVERSATION HISTORY:
+{history_context}
+
+Be friendly, helpful, and remember the conversation context. If the user asks for elaboration or says "yes please", continue the previous topic."""
+    
     def _get_chat_history(self, user_id: str) -> list:
         """Get recent chat history for user from persistent storage"""
         try:
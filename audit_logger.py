@@ -1,12 +1,21 @@
-import json
 import os
+import threading
 from datetime import datetime
 from typing import Dict, List
+from json_journal import JsonJournal
+
+PRIORITY_RANK = {"low": 1, "normal": 2, "high": 3, "critical": 4}
 
 class AuditLogger:
     def __init__(self, log_file="audit_log.json"):
         self.log_file = log_file
+        # audit_log.json is the snapshot, new entries go to audit_log.journal.jsonl
+        self.journal = JsonJournal(log_file)
         self.logs = []
+        self._journaled = 0  # how many of self.logs are already in snapshot/journal
+        # Upload workers and request handlers append concurrently; indexes and journal offsets change together
+        self._lock = threading.RLock()
+        self._reset_indexes()
         self.load_logs()
     
     def log_assignment(self, user_id: str, course_id: str, assigned_by: str = "AI", reason: str = "", priority: str = "normal"):
@@ -22,8 +31,7 @@ class AuditLogger:
             "id": len(self.logs) + 1
         }
         
-        self.logs.append(log_entry)
-        self.save_logs()
+        self.append_log(log_entry)
     
     def log_document_processed(self, document_hash: str, assignments_count: int, protocol_title: str = ""):
         """Logs document processing"""
@@ -37,8 +45,58 @@ class AuditLogger:
             "id": len(self.logs) + 1
         }
         
-        self.logs.append(log_entry)
-        self.save_logs()
+        self.append_log(log_entry)
+    
+    def append_log(self, log_entry: Dict) -> Dict:
+        """Appends one entry to memory and the journal, O(1) regardless of log size"""
+        with self._lock:
+            if "id" in log_entry:
+                # Numbered under the lock so concurrent writers do not share an id
+                log_entry["id"] = len(self.logs) + 1
+            self.logs.append(log_entry)
+            self._write_pending()
+        self._compact_if_needed()
+        return log_entry
+    
+    def get_logs(self, action: str = None, user_id: str = None, course_id: str = None, document_hash: str = None) -> List[Dict]:
+        """Entries matching all given filters, read from the smallest matching index"""
+        self._index_pending()
+        candidates = []
+        if action is not None:
+            candidates.append(self._by_action.get(action, []))
+        if user_id is not None:
+            candidates.append(self._by_user.get(user_id, []))
+        if course_id is not None:
+            candidates.append(self._by_course.get(course_id, []))
+        if document_hash is not None:
+            candidates.append(self._by_document.get(document_hash, []))
+        if not candidates:
+            return list(self.logs)
+        
+        smallest = min(candidates, key=len)
+        return [log for log in smallest
+                if (action is None or log.get("action") == action)
+                and (user_id is None or log.get("user_id") == user_id)
+                and (course_id is None or log.get("course_id") == course_id)
+                and (document_hash is None or log.get("document_hash") == document_hash)]
+    
+    def count_logs(self, action: str) -> int:
+        self._index_pending()
+        return len(self._by_action.get(action, []))
+    
+    def get_course_stats(self, course_id: str) -> Dict:
+        """Running aggregates over course_assigned entries for a course"""
+        self._index_pending()
+        return dict(self._course_stats.get(course_id) or {"assignments_count": 0, "latest_assignment": None, "priority": "normal"})
+    
+    def get_user_stats(self, user_id: str) -> Dict:
+        """Running aggregates over course_assigned entries for a user"""
+        self._index_pending()
+        return dict(self._user_stats.get(user_id) or {"assignments_count": 0, "latest_assignment": None})
+    
+    def get_completed_courses(self, user_id: str) -> List[str]:
+        """Course ids from course_completed entries for a user"""
+        return [log.get("course_id") for log in self.get_logs(action="course_completed", user_id=user_id)]
     
     def get_recent_logs(self, limit: int = 50) -> List[Dict]:
         """Gets recent log entries"""
@@ -46,19 +104,90 @@ class AuditLogger:
     
     def get_user_history(self, user_id: str) -> List[Dict]:
         """Gets assignment history for user"""
-        return [log for log in self.logs if log.get("user_id") == user_id and log["action"] == "course_assigned"]
+        return self.get_logs(action="course_assigned", user_id=user_id)
     
     def save_logs(self):
-        """Saves logs to file"""
-        with open(self.log_file, 'w', encoding='utf-8') as f:
-            json.dump(self.logs, f, ensure_ascii=False, indent=2)
+        """Journals entries appended directly to self.logs and fsyncs the journal"""
+        self._write_pending()
+        self.journal.sync()
+        self._compact_if_needed()
+    
+    def compact(self):
+        """Folds the journal into a fresh audit_log.json snapshot"""
+        with self._lock:
+            self._write_pending()
+            snapshot = list(self.logs)
+        # The snapshot is written outside the lock, appends keep going meanwhile
+        self.journal.compact(snapshot)
+    
+    def close(self):
+        with self._lock:
+            self._write_pending()
+            self.journal.close()
+    
+    def _reset_indexes(self):
+        self._by_user = {}  # user_id -> [entry]
+        self._by_course = {}  # course_id -> [entry]
+        self._by_action = {}  # action -> [entry]
+        self._by_document = {}  # document_hash -> [entry]
+        self._course_stats = {}  # course_id -> assignment aggregates
+        self._user_stats = {}  # user_id -> assignment aggregates
+        self._indexed = 0  # how many of self.logs are already in the indexes
+    
+    def _index_pending(self):
+        """Indexes entries added since the last call (including ones appended straight to self.logs)"""
+        with self._lock:
+            while self._indexed < len(self.logs):
+                self._index_entry(self.logs[self._indexed])
+                self._indexed += 1
+    
+    def _index_entry(self, log: Dict):
+        for index, key in ((self._by_user, log.get("user_id")), (self._by_course, log.get("course_id")),
+                           (self._by_action, log.get("action")), (self._by_document, log.get("document_hash"))):
+            if key:
+                index.setdefault(key, []).append(log)
+        
+        if log.get("action") != "course_assigned":
+            return
+        timestamp = log.get("timestamp")
+        
+        course_id = log.get("course_id")
+        if course_id:
+            stats = self._course_stats.setdefault(course_id, {"assignments_count": 0, "latest_assignment": None, "priority": "normal"})
+            stats["assignments_count"] += 1
+            if timestamp and (not stats["latest_assignment"] or timestamp > stats["latest_assignment"]):
+                stats["latest_assignment"] = timestamp
+            # Самый высокий приоритет из AI-назначений
+            priority = log.get("priority")
+            if priority and PRIORITY_RANK.get(priority, 2) > PRIORITY_RANK.get(stats["priority"], 2):
+                stats["priority"] = priority
+        
+        user_id = log.get("user_id")
+        if user_id:
+            stats = self._user_stats.setdefault(user_id, {"assignments_count": 0, "latest_assignment": None})
+            stats["assignments_count"] += 1
+            if timestamp and (not stats["latest_assignment"] or timestamp > stats["latest_assignment"]):
+                stats["latest_assignment"] = timestamp
+    
+    def _write_pending(self):
+        with self._lock:
+            self._index_pending()
+            while self._journaled < len(self.logs):
+                self.journal.append(self._journaled, self.logs[self._journaled])
+                self._journaled += 1
+    
+    def _compact_if_needed(self):
+        if self.journal.needs_compaction():
+            self.compact()
     
     def load_logs(self):
-        """Loads logs from file"""
-        if os.path.exists(self.log_file):
+        """Loads snapshot and replays the journal tail"""
+        if os.path.exists(self.log_file) or os.path.exists(self.journal.journal_file):
             try:
-                with open(self.log_file, 'r', encoding='utf-8') as f:
-                    self.logs = json.load(f)
+                self.logs = self.journal.load()
             except Exception as e:
                 print(f"Error loading logs: {e}")
-                self.logs = []
\ No newline at end of file
+                self.logs = []
+        self._journaled = len(self.logs)
+        self._reset_indexes()
+        self._index_pending()
@@ -1,57 +1,330 @@
+import asyncio
 import boto3
 import json
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectTimeoutError, ReadTimeoutError
+from decision_cache import DecisionCache
+from prompt_segments import PromptSegments, estimate_tokens, fit_tokens, text_key
+from protocol_chunker import chunk_protocol, merge_requirements
+
+# Output tokens budgeted per decision in a batched analysis response
+DECISION_TOKENS = 150
+
+# Bedrock error codes worth retrying with backoff
+RETRYABLE_ERRORS = {"ThrottlingException", "ServiceUnavailableException", "ModelNotReadyException", "TooManyRequestsException"}
+
+class BedrockMetrics:
+    """Thread-safe counters and latencies for Bedrock calls"""
+    
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        self.calls = 0
+        self.errors = 0
+        self.throttles = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.latencies = []  # seconds, last `window` successful calls
+        self.first_token_latencies = []  # seconds, last `window` streamed responses
+        self.tokens = {"input": 0, "output": 0, "cache_read": 0, "cache_write": 0}  # as reported by the model
+        self.segment_tokens = {}  # prompt segment -> estimated tokens sent
+    
+    def record(self, field: str, amount: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+    
+    def record_latency(self, seconds: float, field: str = "latencies"):
+        with self._lock:
+            values = getattr(self, field)
+            values.append(seconds)
+            if len(values) > self.window:
+                setattr(self, field, values[-self.window:])
+    
+    def record_usage(self, usage: dict):
+        with self._lock:
+            self.tokens["input"] += usage.get("input_tokens", 0)
+            self.tokens["output"] += usage.get("output_tokens", 0)
+            self.tokens["cache_read"] += usage.get("cache_read_input_tokens", 0)
+            self.tokens["cache_write"] += usage.get("cache_creation_input_tokens", 0)
+    
+    def record_segments(self, segments: dict):
+        with self._lock:
+            for name, tokens in segments.items():
+                self.segment_tokens[name] = self.segment_tokens.get(name, 0) + tokens
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            def percentile(values, p):
+                if not values:
+                    return 0.0
+                values = sorted(values)
+                return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 1)
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "throttles": self.throttles,
+                "retries": self.retries,
+                "timeouts": self.timeouts,
+                "in_flight": self.in_flight,
+                "latency_ms": {"p50": percentile(self.latencies, 0.5), "p95": percentile(self.latencies, 0.95), "max": percentile(self.latencies, 1.0)},
+                "first_token_ms": {"p50": percentile(self.first_token_latencies, 0.5), "p95": percentile(self.first_token_latencies, 0.95)},
+                "tokens": dict(self.tokens),
+                "segment_tokens": dict(self.segment_tokens)
+            }
 
 class BedrockClient:
+    # Shared by every client in the process so total in-flight calls stay bounded
+    _semaphore = threading.BoundedSemaphore(int(os.getenv('BEDROCK_MAX_CONCURRENCY', '16')))
+    _executor = ThreadPoolExecutor(max_workers=int(os.getenv('BEDROCK_MAX_CONCURRENCY', '16')), thread_name_prefix="bedrock")
+    metrics = BedrockMetrics()
+    
     def __init__(self):
-        self.client = boto3.client(
-            'bedrock-runtime',
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.getenv('AWS_DEFAULT_REGION', 'us-east-1')
-        )
+        if os.getenv('BEDROCK_FAKE', 'false').lower() == 'true':
+            # Deterministic in-process stand-in for benchmarks, see bedrock_stub.py
+            from bedrock_stub import FakeBedrockRuntime
+            self.client = FakeBedrockRuntime.shared()
+        else:
+            self.client = boto3.client(
+                'bedrock-runtime',
+                aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+                aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+                region_name=os.getenv('AWS_DEFAULT_REGION', 'us-east-1'),
+                # Local stub endpoint for offline load tests, see bedrock_stub.py
+                endpoint_url=os.getenv('BEDROCK_ENDPOINT_URL') or None,
+                config=Config(
+                    max_pool_connections=int(os.getenv('BEDROCK_MAX_CONNECTIONS', '32')),
+                    connect_timeout=float(os.getenv('BEDROCK_CONNECT_TIMEOUT', '5')),
+                    read_timeout=float(os.getenv('BEDROCK_READ_TIMEOUT', '60')),
+                    # Retries are done in _invoke_model with jittered backoff
+                    retries={"total_max_attempts": 1, "mode": "standard"}
+                )
+            )
         self.model_id = os.getenv('BEDROCK_MODEL_ID', 'us.anthropic.claude-3-5-haiku-20241022-v1:0')
+        self.max_retries = int(os.getenv('BEDROCK_MAX_RETRIES', '4'))
+        self.backoff_base = float(os.getenv('BEDROCK_BACKOFF_BASE', '0.5'))
+        self.backoff_cap = float(os.getenv('BEDROCK_BACKOFF_CAP', '8'))
+        self.decision_cache = DecisionCache()
+        self.chunk_chars = int(os.getenv('PROTOCOL_CHUNK_CHARS', '6000'))
+        self.summary_max_chars = int(os.getenv('PROTOCOL_SUMMARY_MAX_CHARS', '4000'))
+        self.map_workers = int(os.getenv('PROTOCOL_MAP_WORKERS', '8'))
+        self.segments = PromptSegments()
+        # Per-segment token budgets of the analysis prompt
+        self.protocol_max_tokens = int(os.getenv('PROMPT_PROTOCOL_MAX_TOKENS', '2000'))
+        self.courses_max_tokens = int(os.getenv('PROMPT_COURSES_MAX_TOKENS', '3000'))
+        self.user_max_tokens = int(os.getenv('PROMPT_USER_MAX_TOKENS', '300'))
+        # Provider-side caching of the stable prompt prefix (model must support it)
+        self.prompt_caching = os.getenv('BEDROCK_PROMPT_CACHING', 'false').lower() == 'true'
+        # Batched analysis: users per call adapts down when a response runs out of room
+        self.context_tokens = int(os.getenv('BEDROCK_CONTEXT_TOKENS', '200000'))
+        self.max_output_tokens = int(os.getenv('BEDROCK_MAX_OUTPUT_TOKENS', '8192'))
+        self.max_batch_size = int(os.getenv('ANALYSIS_BATCH_SIZE', '20'))
+        self.batch_retries = int(os.getenv('ANALYSIS_BATCH_RETRIES', '1'))
+        self.batch_size = self.max_batch_size
+        self._batch_lock = threading.Lock()
+    
+    def _invoke_model(self, body: dict, model_id: str = None) -> dict:
+        """invoke_model with the global concurrency limit and jittered exponential backoff"""
+        def call():
+            response = self.client.invoke_model(modelId=model_id or self.model_id, body=json.dumps(body))
+            return json.loads(response['body'].read())
+        result = self._call_with_backoff(call)
+        self.metrics.record_usage(result.get("usage", {}))
+        return result
+    
+    def _call_with_backoff(self, call, acquire: bool = True):
+        """Retries throttling/unavailable errors; acquire=False when the caller already holds the semaphore"""
+        for attempt in range(self.max_retries + 1):
+            with (self._semaphore if acquire else nullcontext()):
+                self.metrics.record("in_flight")
+                self.metrics.record("calls")
+                started = time.perf_counter()
+                try:
+                    result = call()
+                    self.metrics.record_latency(time.perf_counter() - started)
+                    return result
+                except ClientError as e:
+                    code = e.response.get("Error", {}).get("Code", "")
+                    if code not in RETRYABLE_ERRORS or attempt == self.max_retries:
+                        self.metrics.record("errors")
+                        raise
+                    if code in ("ThrottlingException", "TooManyRequestsException"):
+                        self.metrics.record("throttles")
+                except (ConnectTimeoutError, ReadTimeoutError):
+                    self.metrics.record("timeouts")
+                    if attempt == self.max_retries:
+                        self.metrics.record("errors")
+                        raise
+                finally:
+                    self.metrics.record("in_flight", -1)
+            
+            # Full jitter: sleep outside the semaphore so other calls can proceed
+            self.metrics.record("retries")
+            time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt))))
+    
+    def _chat_body(self, messages: list, system_prompt: str, max_tokens: int, temperature: float = None) -> dict:
+        body = {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "system": system_prompt,
+            "messages": messages
+        }
+        if temperature is not None:
+            body["temperature"] = temperature
+        return body
+    
+    def chat_messages(self, messages: list, system_prompt: str = "", max_tokens: int = 500, temperature: float = None) -> str:
+        """Multi-turn completion, raises on failure"""
+        result = self._invoke_model(self._chat_body(messages, system_prompt, max_tokens, temperature))
+        return result['content'][0]['text']
+    
+    def stream_chat_messages(self, messages: list, system_prompt: str = "", max_tokens: int = 500, temperature: float = None):
+        """Yields text deltas from invoke_model_with_response_stream as they arrive"""
+        body = self._chat_body(messages, system_prompt, max_tokens, temperature)
+        # The semaphore is held for the whole stream, not just the initial request
+        with self._semaphore:
+            started = time.perf_counter()
+            response = self._call_with_backoff(
+                lambda: self.client.invoke_model_with_response_stream(modelId=self.model_id, body=json.dumps(body)),
+                acquire=False
+            )
+            first_token = True
+            for event in response['body']:
+                chunk = json.loads(event['chunk']['bytes']) if 'chunk' in event else {}
+                if chunk.get('type') in ('message_start', 'message_delta'):
+                    self.metrics.record_usage(chunk.get('usage') or chunk.get('message', {}).get('usage', {}))
+                if chunk.get('type') != 'content_block_delta':
+                    continue
+                text = chunk.get('delta', {}).get('text', '')
+                if text:
+                    if first_token:
+                        self.metrics.record_latency(time.perf_counter() - started, "first_token_latencies")
+                        first_token = False
+                    yield text
     
     def chat(self, message: str, system_prompt: str = "") -> str:
         try:
-            response = self.client.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 500,
-                    "temperature": 0.7,
-                    "system": system_prompt,
-                    "messages": [{"role": "user", "content": message}]
-                })
-            )
-            
-            result = json.loads(response['body'].read())
-            return result['content'][0]['text']
+            return self.chat_messages([{"role": "user", "content": message}], system_prompt, temperature=0.7)
             
         except Exception as e:
             return f"☕ Hello! I'm Random Coffee AI. I'll help you find colleagues for meetings. Error: {str(e)[:50]}..."
     
-    def analyze_protocol(self, protocol_text: str, user_data: dict, courses: list) -> dict:
-        """Analyze safety protocol and determine course assignments"""
+    async def _run_async(self, func, *args, **kwargs):
+        """Runs a blocking call on the Bedrock pool so the event loop stays free"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+    
+    async def achat_messages(self, messages: list, system_prompt: str = "", max_tokens: int = 500, temperature: float = None) -> str:
+        return await self._run_async(self.chat_messages, messages, system_prompt, max_tokens, temperature)
+    
+    async def achat(self, message: str, system_prompt: str = "") -> str:
+        return await self._run_async(self.chat, message, system_prompt)
+    
+    async def aanalyze_protocol(self, protocol_text: str, user_data: dict, courses: list, use_cache: bool = True, summary: dict = None) -> dict:
+        return await self._run_async(self.analyze_protocol, protocol_text, user_data, courses, use_cache, summary)
+    
+    def get_metrics(self) -> dict:
+        return {**self.metrics.snapshot(), "prompt_segments": self.segments.get_stats()}
+    
+    def summarize_protocol(self, protocol_text: str, use_cache: bool = True) -> dict:
+        """Requirement summary of the whole document: chunks are mapped in parallel, reduced locally"""
+        cache_key = self.decision_cache.make_key(self.model_id, protocol_text, "protocol-summary", str(self.chunk_chars))
+        if use_cache:
+            cached = self.decision_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        chunks = chunk_protocol(protocol_text, self.chunk_chars)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.map_workers, len(chunks)))) as executor:
+            extractions = list(executor.map(self._extract_requirements, chunks))
+        
+        section_count = sum(len(c["titles"]) for c in chunks)
+        summary = merge_requirements(extractions, section_count, self.summary_max_chars)
+        if len(chunks) <= 1:
+            # Short protocol fits into the prompt as is, the extraction is kept for revision diffs
+            summary["text"] = protocol_text.strip()
+        # Chunks that fell back to raw excerpts are retried on the next upload
+        if not any(e.get("fallback") for e in extractions):
+            self.decision_cache.put(cache_key, summary, save=False)
+        return summary
+    
+    def _extract_requirements(self, chunk: dict) -> dict:
+        """Map step: hazards and required training from one chunk"""
+        prompt = f"""Extract the safety requirements from this part of a safety protocol ({', '.join(chunk['titles'])}).
+
+TEXT:
+{chunk['text']}
+
+Respond in JSON format:
+{{
+  "hazards": ["short hazard names"],
+  "required_training": ["training the text requires, with who must take it"],
+  "requirements": ["other concrete obligations, one short sentence each"]
+}}"""
         try:
-            # Create course list for AI
-            course_list = "\n".join([f"- {c['course_id']}: {c.get('description', 'Safety training course')}" for c in courses])
-            
-            # Create user context
+            result = self._invoke_model({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": 600,
+                "temperature": 0,
+                "messages": [{"role": "user", "content": prompt}]
+            })
+            ai_response = result['content'][0]['text']
+            extraction = json.loads(ai_response[ai_response.find('{'):ai_response.rfind('}') + 1])
+            return {key: [str(v) for v in extraction.get(key, []) if v] for key in ("hazards", "required_training", "requirements")}
+        except Exception as e:
+            print(f"Protocol chunk {chunk['index']} extraction error: {str(e)}")
+            # Keep the section in the summary even without the model
+            excerpt = " ".join(chunk['text'].split())[:300]
+            return {"hazards": [], "required_training": [], "requirements": [f"{chunk['titles'][0]}: {excerpt}"], "fallback": True}
+    
+    def _text_block(self, text: str, cache: bool = False) -> dict:
+        block = {"type": "text", "text": text}
+        if cache and self.prompt_caching:
+            block["cache_control"] = {"type": "ephemeral"}
+        return block
+    
+    def _user_context(self, user_data: dict) -> str:
+        if user_data.get('cohort_size'):
+            user_context = f"Cohort: {user_data['cohort_size']} users ({user_data['role']}) in {user_data['department']}"
+            user_context += "\nDecide for the whole cohort; courses a user already has are filtered out per user afterwards."
+        else:
             user_context = f"User: {user_data['name']} ({user_data['role']}) in {user_data['department']}"
-            completed = user_data.get('completed_courses', [])
-            if completed:
-                user_context += f"\nCompleted courses: {', '.join([c['course_id'] for c in completed])}"
-            
-            prompt = f"""Analyze this safety protocol and determine if the user needs training courses.
+        completed = user_data.get('completed_courses', [])
+        if completed:
+            completed_ids = [c if isinstance(c, str) else c['course_id'] for c in completed]
+            user_context += f"\nCompleted courses: {', '.join(completed_ids)}"
+        return user_context
+    
+    def _shared_segments(self, summary: dict, courses: list) -> tuple:
+        """(key, protocol, course list) segments shared by single and batched analysis prompts"""
+        catalog_version = self.decision_cache.catalog_version(courses)
+        protocol_key = text_key(summary['text'])
+        course_list = self.segments.get("courses", catalog_version, lambda: "\n".join(
+            [f"- {c['course_id']}: {c.get('description', 'Safety training course')}" for c in courses]
+        ), self.courses_max_tokens)
+        protocol = self.segments.get("protocol", protocol_key, lambda: summary['text'], self.protocol_max_tokens)
+        return f"{protocol_key}:{catalog_version}", protocol, course_list
+    
+    def _analysis_prefix(self, summary: dict, courses: list) -> dict:
+        """Instructions, protocol and course catalog: identical for every user of a document"""
+        key, protocol, course_list = self._shared_segments(summary, courses)
+        return self.segments.get("analysis_prefix", key, lambda: f"""Analyze this safety protocol and determine if the user described at the end needs training courses.
 
 PROTOCOL:
-{protocol_text[:1000]}
-
-{user_context}
+{protocol['text']}
 
 AVAILABLE COURSES:
-{course_list}
+{course_list['text']}
 
 Analyze the protocol content and determine:
 1. Does this user need any safety training based on the protocol?
@@ -72,19 +345,68 @@ Respond in JSON format:
     }}
   ],
   "reason": "Brief explanation"
-}}"""
+}}""", protocol["tokens"] + course_list["tokens"] + 300)
+    
+    def _batch_prefix(self, summary: dict, courses: list) -> dict:
+        key, protocol, course_list = self._shared_segments(summary, courses)
+        return self.segments.get("batch_prefix", key, lambda: f"""Analyze this safety protocol and determine which training courses each user in the numbered list at the end needs.
+
+PROTOCOL:
+{protocol['text']}
+
+AVAILABLE COURSES:
+{course_list['text']}
+
+For every user determine:
+1. Does this user need any safety training based on the protocol?
+2. Which specific courses are relevant?
+3. What priority level (critical, high, normal, low)?
+4. How often should they renew (months)?
+5. Deadline for completion (days)?
+
+Respond with a JSON array holding exactly one object per user, with the user's number as "ref":
+[
+  {{
+    "ref": 1,
+    "should_assign": true/false,
+    "recommended_courses": [
+      {{
+        "course_id": "COURSE_ID",
+        "priority": "critical/high/normal/low",
+        "renewal_months": 12,
+        "deadline_days": 30
+      }}
+    ],
+    "reason": "Brief explanation"
+  }}
+]""", protocol["tokens"] + course_list["tokens"] + 350)
+    
+    def analyze_protocol(self, protocol_text: str, user_data: dict, courses: list, use_cache: bool = True, summary: dict = None) -> dict:
+        """Analyze safety protocol and determine course assignments"""
+        try:
+            user_context = self._user_context(user_data)
             
-            response = self.client.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 1000,
-                    "temperature": 0.3,
-                    "messages": [{"role": "user", "content": prompt}]
-                })
-            )
+            # Same model, protocol, user context and catalog -> same decision
+            cache_key = self.decision_cache.make_key(self.model_id, protocol_text, user_context, self.decision_cache.catalog_version(courses))
+            if use_cache:
+                cached = self.decision_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            
+            # Whole-document summary, computed once per document by the caller when possible
+            if summary is None:
+                summary = self.summarize_protocol(protocol_text, use_cache)
+            
+            prefix = self._analysis_prefix(summary, courses)
+            user_text = fit_tokens(user_context, self.user_max_tokens)
+            self.metrics.record_segments({"analysis_prefix": prefix["tokens"], "user": estimate_tokens(user_text)})
             
-            result = json.loads(response['body'].read())
+            result = self._invoke_model({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": 1000,
+                "temperature": 0.3,
+                "messages": [{"role": "user", "content": [self._text_block(prefix["text"], cache=True), self._text_block(user_text)]}]
+            })
             ai_response = result['content'][0]['text']
             
             # Parse JSON response
@@ -94,7 +416,9 @@ Respond in JSON format:
                 json_end = ai_response.rfind('}') + 1
                 if json_start >= 0 and json_end > json_start:
                     json_str = ai_response[json_start:json_end]
-                    return json.loads(json_str)
+                    decision = json.loads(json_str)
+                    self.decision_cache.put(cache_key, decision, save=False)
+                    return decision
                 else:
                     # Fallback if no JSON found
                     return {
@@ -116,4 +440,110 @@ Respond in JSON format:
                 "should_assign": False,
                 "recommended_courses": [],
                 "reason": f"Analysis error: {str(e)}"
-            }
\ No newline at end of file
+            }
+    
+    def analyze_protocol_batch(self, protocol_text: str, subjects: list, courses: list, use_cache: bool = True, summary: dict = None, max_workers: int = None) -> list:
+        """analyze_protocol for many users/cohorts, several per call; decisions in input order"""
+        catalog_version = self.decision_cache.catalog_version(courses)
+        contexts = [self._user_context(s) for s in subjects]
+        keys = [self.decision_cache.make_key(self.model_id, protocol_text, c, catalog_version) for c in contexts]
+        decisions = [self.decision_cache.get(key) if use_cache else None for key in keys]
+        pending = [i for i, d in enumerate(decisions) if d is None]
+        if not pending:
+            return decisions
+        
+        if summary is None:
+            summary = self.summarize_protocol(protocol_text, use_cache)
+        prefix = self._batch_prefix(summary, courses)
+        rows = [(i, "; ".join(fit_tokens(contexts[i], self.user_max_tokens).splitlines())) for i in pending]
+        
+        # Batch size fits both the context window and the output limit
+        row_tokens = max(estimate_tokens(row) for _, row in rows) + 2
+        with self._batch_lock:
+            size = max(1, min(self.batch_size,
+                              (self.context_tokens - prefix["tokens"] - 500) // row_tokens,
+                              (self.max_output_tokens - 200) // DECISION_TOKENS))
+        batches = [rows[start:start + size] for start in range(0, len(rows), size)]
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers or self.map_workers, len(batches)))) as executor:
+            for decided in executor.map(lambda batch: self._analyze_batch(prefix, batch), batches):
+                for i, decision in decided.items():
+                    decisions[i] = decision
+                    self.decision_cache.put(keys[i], decision, save=False)
+        
+        # Users the batches could not decide get the single-user prompt and its fallbacks
+        for i in pending:
+            if decisions[i] is None:
+                decisions[i] = self.analyze_protocol(protocol_text, subjects[i], courses, use_cache, summary)
+        return decisions
+    
+    def _analyze_batch(self, prefix: dict, batch: list) -> dict:
+        """{subject index: decision} for one batch, retrying only entries that came back missing or malformed"""
+        decided = {}
+        remaining = batch
+        for attempt in range(self.batch_retries + 1):
+            try:
+                entries, overflow = self._invoke_batch(prefix, remaining)
+            except ClientError as e:
+                # Input too long for the model is handled like an output overflow
+                if e.response.get("Error", {}).get("Code") != "ValidationException":
+                    print(f"Batch analysis error: {str(e)}")
+                    return decided
+                entries, overflow = {}, True
+            except Exception as e:
+                print(f"Batch analysis error: {str(e)}")
+                return decided
+            
+            for ref, (i, _) in enumerate(remaining, 1):
+                if ref in entries:
+                    decided[i] = entries[ref]
+            remaining = [row for row in remaining if row[0] not in decided]
+            if not remaining:
+                break
+            if overflow and len(remaining) > 1:
+                # Response ran out of room: later batches get smaller, this one is split
+                with self._batch_lock:
+                    self.batch_size = max(1, min(self.batch_size, len(remaining) // 2))
+                half = len(remaining) // 2
+                decided.update(self._analyze_batch(prefix, remaining[:half]))
+                decided.update(self._analyze_batch(prefix, remaining[half:]))
+                return decided
+        
+        if not remaining and len(batch) >= self.batch_size:
+            with self._batch_lock:
+                self.batch_size = min(self.max_batch_size, self.batch_size + 1)
+        return decided
+    
+    def _invoke_batch(self, prefix: dict, batch: list) -> tuple:
+        """One batched call, returns ({ref: valid decision}, response ran out of output tokens)"""
+        users_text = f"USERS ({len(batch)}):\n" + "\n".join(f"{ref}. {row}" for ref, (_, row) in enumerate(batch, 1))
+        self.metrics.record_segments({"batch_prefix": prefix["tokens"], "batch_users": estimate_tokens(users_text)})
+        
+        result = self._invoke_model({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": min(self.max_output_tokens, 200 + DECISION_TOKENS * len(batch)),
+            "temperature": 0.3,
+            "messages": [{"role": "user", "content": [self._text_block(prefix["text"], cache=True), self._text_block(users_text)]}]
+        })
+        ai_response = result['content'][0]['text']
+        
+        try:
+            items = json.loads(ai_response[ai_response.find('['):ai_response.rfind(']') + 1])
+        except json.JSONDecodeError:
+            items = []
+        
+        entries = {}
+        for item in items if isinstance(items, list) else []:
+            ref = item.get("ref") if isinstance(item, dict) else None
+            if isinstance(ref, int) and 1 <= ref <= len(batch) and ref not in entries and self._valid_decision(item):
+                entries[ref] = {k: v for k, v in item.items() if k != "ref"}
+        return entries, result.get("stop_reason") == "max_tokens"
+    
+    @staticmethod
+    def _valid_decision(decision: dict) -> bool:
+        if not isinstance(decision.get("should_assign"), bool):
+            return False
+        recommended = decision.get("recommended_courses", [])
+        return isinstance(recommended, list) and all(
+            isinstance(c, str) or (isinstance(c, dict) and isinstance(c.get("course_id"), str)) for c in recommended
+        )
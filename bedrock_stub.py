@@ -0,0 +1,245 @@
+"""Local stand-ins for the bedrock-runtime invoke_model endpoint.
+
+FakeBedrockRuntime replaces the boto3 client in process (BEDROCK_FAKE=true),
+deterministic for a given STUB_SEED; benchmark.py runs the app against it.
+
+Or run the stub as a server and point the app at it:
+
+    python bedrock_stub.py                      # serves on :8001
+    BEDROCK_ENDPOINT_URL=http://localhost:8001 AWS_ACCESS_KEY_ID=stub AWS_SECRET_ACCESS_KEY=stub uvicorn main_simple:app
+
+Quick offline load test of BedrockClient against a running stub:
+
+    python bedrock_stub.py --load 200
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import time
+from io import BytesIO
+
+from botocore.exceptions import ClientError
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Bedrock Stub")
+
+STUB_LATENCY_MS = float(os.getenv('STUB_LATENCY_MS', '300'))
+STUB_THROTTLE_RATE = float(os.getenv('STUB_THROTTLE_RATE', '0'))
+STUB_TOKEN_MS = float(os.getenv('STUB_TOKEN_MS', '30'))
+# Batched analysis: share of entries left out, and users per call above which the output "runs out"
+STUB_BATCH_DROP_RATE = float(os.getenv('STUB_BATCH_DROP_RATE', '0'))
+STUB_BATCH_LIMIT = int(os.getenv('STUB_BATCH_LIMIT', '1000'))
+# Non-retryable model errors, in-process fake only
+STUB_FAILURE_RATE = float(os.getenv('STUB_FAILURE_RATE', '0'))
+STUB_SEED = os.getenv('STUB_SEED', '42')
+
+def fake_completion(body: dict, rng=random) -> tuple:
+    """Canned model output and stop reason: JSON for protocol and extraction prompts, a short reply otherwise"""
+    prompt = json.dumps(body.get("messages", []))
+    if "USERS (" in prompt and "AVAILABLE COURSES" in prompt:
+        course_ids = re.findall(r"\\n- ([A-Za-z0-9.\-]+):", prompt)
+        refs = [int(r) for r in re.findall(r"\\n(\d+)\. ", prompt.split("USERS (", 1)[1])]
+        entries = [{"ref": ref, "should_assign": bool(course_ids), "reason": "Stub decision",
+                    "recommended_courses": [{"course_id": c, "priority": "normal", "renewal_months": 12, "deadline_days": 30} for c in course_ids[:1]]}
+                   for ref in refs if rng.random() >= STUB_BATCH_DROP_RATE]
+        text = json.dumps(entries)
+        if len(refs) > STUB_BATCH_LIMIT:
+            return text[:len(text) // 2], "max_tokens"
+        return text, "end_turn"
+    if "AVAILABLE COURSES" in prompt:
+        course_ids = re.findall(r"\\n- ([A-Za-z0-9.\-]+):", prompt)
+        recommended = [{"course_id": c, "priority": "normal", "renewal_months": 12, "deadline_days": 30} for c in course_ids[:1]]
+        return json.dumps({"should_assign": bool(recommended), "recommended_courses": recommended, "reason": "Stub decision"}), "end_turn"
+    if "Extract the safety requirements" in prompt:
+        hazards = sorted(set(re.findall(r"\b(radiation|x-ray|chemical|laser|biological|fire|noise)\b", prompt.replace("\\n", " ").lower())))
+        return json.dumps({"hazards": hazards, "required_training": [f"{h.title()} safety training" for h in hazards], "requirements": []}), "end_turn"
+    return "Stub reply: stay safe and wear your PPE.", "end_turn"
+
+_cached_prefixes = set()
+
+def fake_usage(body: dict, text: str) -> dict:
+    """Token usage, with blocks marked cache_control billed as cache writes first and cache reads after"""
+    usage = {"input_tokens": len(json.dumps(body)) // 4, "output_tokens": len(text) // 4,
+             "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+    for message in body.get("messages", []):
+        content = message.get("content")
+        for block in content if isinstance(content, list) else []:
+            if "cache_control" not in block:
+                continue
+            tokens = len(block.get("text", "")) // 4
+            usage["input_tokens"] -= tokens
+            field = "cache_read_input_tokens" if block.get("text") in _cached_prefixes else "cache_creation_input_tokens"
+            usage[field] += tokens
+            _cached_prefixes.add(block.get("text"))
+    return usage
+
+@app.post("/model/{model_id:path}/invoke")
+async def invoke_model(model_id: str, request: Request):
+    body = await request.json()
+    await asyncio.sleep(STUB_LATENCY_MS / 1000 * random.uniform(0.5, 1.5))
+
+    if random.random() < STUB_THROTTLE_RATE:
+        return JSONResponse(
+            status_code=429,
+            content={"message": "Too many requests, please wait before trying again."},
+            headers={"x-amzn-ErrorType": "ThrottlingException"}
+        )
+
+    text, stop_reason = fake_completion(body)
+    return {
+        "id": "msg_stub",
+        "type": "message",
+        "role": "assistant",
+        "model": model_id,
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": stop_reason,
+        "usage": fake_usage(body, text)
+    }
+
+def encode_event(payload: dict) -> bytes:
+    """One application/vnd.amazon.eventstream message carrying a response-stream chunk"""
+    body = json.dumps({"bytes": base64.b64encode(json.dumps(payload).encode()).decode()}).encode()
+    headers = b""
+    for name, value in ((":event-type", "chunk"), (":content-type", "application/json"), (":message-type", "event")):
+        headers += struct.pack("B", len(name)) + name.encode() + struct.pack("!BH", 7, len(value)) + value.encode()
+    prelude = struct.pack("!II", 16 + len(headers) + len(body), len(headers))
+    message = prelude + struct.pack("!I", binascii.crc32(prelude)) + headers + body
+    return message + struct.pack("!I", binascii.crc32(message))
+
+@app.post("/model/{model_id:path}/invoke-with-response-stream")
+async def invoke_model_with_response_stream(model_id: str, request: Request):
+    body = await request.json()
+    await asyncio.sleep(STUB_LATENCY_MS / 1000 * random.uniform(0.5, 1.5))
+
+    if random.random() < STUB_THROTTLE_RATE:
+        return JSONResponse(
+            status_code=429,
+            content={"message": "Too many requests, please wait before trying again."},
+            headers={"x-amzn-ErrorType": "ThrottlingException"}
+        )
+
+    async def events():
+        yield encode_event({"type": "message_start", "message": {"id": "msg_stub", "model": model_id, "role": "assistant"}})
+        yield encode_event({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for word in re.findall(r"\S+\s*", fake_completion(body)[0]):
+            await asyncio.sleep(STUB_TOKEN_MS / 1000)
+            yield encode_event({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}})
+        yield encode_event({"type": "content_block_stop", "index": 0})
+        yield encode_event({"type": "message_stop"})
+
+    return StreamingResponse(events(), media_type="application/vnd.amazon.eventstream")
+
+class FakeBedrockRuntime:
+    """In-process bedrock-runtime client with the stub's answers, latency, throttling and failures.
+
+    Every random draw comes from a generator seeded with the seed, the request
+    body and how often that body was sent before, so a run is reproducible
+    regardless of thread interleaving.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, seed: str = None, latency_ms: float = None, throttle_rate: float = None,
+                 failure_rate: float = None, token_ms: float = None):
+        self.seed = seed if seed is not None else STUB_SEED
+        self.latency_ms = STUB_LATENCY_MS if latency_ms is None else latency_ms
+        self.throttle_rate = STUB_THROTTLE_RATE if throttle_rate is None else throttle_rate
+        self.failure_rate = STUB_FAILURE_RATE if failure_rate is None else failure_rate
+        self.token_ms = STUB_TOKEN_MS if token_ms is None else token_ms
+        self._lock = threading.Lock()
+        self._seen = {}  # body digest -> times sent
+        self.counts = {"invoke_model": 0, "invoke_model_with_response_stream": 0, "throttled": 0, "failed": 0}
+
+    @classmethod
+    def shared(cls) -> "FakeBedrockRuntime":
+        """One fake per process, so call counts cover every BedrockClient"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _begin(self, operation: str, body: str) -> random.Random:
+        digest = hashlib.sha256(body.encode()).hexdigest()
+        with self._lock:
+            occurrence = self._seen.get(digest, 0)
+            self._seen[digest] = occurrence + 1
+            self.counts[operation] += 1
+        rng = random.Random(f"{self.seed}:{digest}:{occurrence}")
+
+        time.sleep(self.latency_ms / 1000 * rng.uniform(0.5, 1.5))
+        roll = rng.random()
+        if roll < self.throttle_rate:
+            self._raise(operation, "ThrottlingException", 429, "Too many requests, please wait before trying again.")
+        if roll < self.throttle_rate + self.failure_rate:
+            self._raise(operation, "ModelErrorException", 424, "The model failed to process the request.")
+        return rng
+
+    def _raise(self, operation: str, code: str, status: int, message: str):
+        with self._lock:
+            self.counts["throttled" if code == "ThrottlingException" else "failed"] += 1
+        raise ClientError({"Error": {"Code": code, "Message": message}, "ResponseMetadata": {"HTTPStatusCode": status}},
+                          "InvokeModel" if operation == "invoke_model" else "InvokeModelWithResponseStream")
+
+    def invoke_model(self, modelId: str, body: str, **kwargs) -> dict:
+        rng = self._begin("invoke_model", body)
+        request = json.loads(body)
+        text, stop_reason = fake_completion(request, rng)
+        payload = {
+            "id": "msg_fake",
+            "type": "message",
+            "role": "assistant",
+            "model": modelId,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": stop_reason,
+            "usage": fake_usage(request, text)
+        }
+        return {"body": BytesIO(json.dumps(payload).encode())}
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str, **kwargs) -> dict:
+        rng = self._begin("invoke_model_with_response_stream", body)
+        request = json.loads(body)
+        text = fake_completion(request, rng)[0]
+
+        def events():
+            yield {"chunk": {"bytes": json.dumps({"type": "message_start", "message": {"id": "msg_fake", "model": modelId, "usage": fake_usage(request, "")}}).encode()}}
+            for word in re.findall(r"\S+\s*", text):
+                time.sleep(self.token_ms / 1000)
+                yield {"chunk": {"bytes": json.dumps({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}}).encode()}}
+            yield {"chunk": {"bytes": json.dumps({"type": "message_delta", "usage": {"output_tokens": len(text) // 4}}).encode()}}
+            yield {"chunk": {"bytes": json.dumps({"type": "message_stop"}).encode()}}
+        return {"body": events()}
+
+    def get_counts(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+async def run_load_test(total_calls: int):
+    from bedrock_client import BedrockClient
+
+    client = BedrockClient()
+    started = time.perf_counter()
+    await asyncio.gather(*[client.achat(f"Load test message {i}") for i in range(total_calls)])
+    elapsed = time.perf_counter() - started
+
+    print(f"{total_calls} calls in {elapsed:.2f}s ({total_calls / elapsed:.1f} calls/s)")
+    print(json.dumps(client.get_metrics(), indent=2))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--load":
+        os.environ.setdefault('BEDROCK_ENDPOINT_URL', 'http://localhost:8001')
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'stub')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'stub')
+        asyncio.run(run_load_test(int(sys.argv[2])))
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=int(os.getenv('STUB_PORT', '8001')))
@@ -0,0 +1,297 @@
+"""Load-test benchmark for /upload-pdf, /chat and /coffee/chat against the in-process Bedrock fake.
+
+    python benchmark.py                              # all scenarios, results appended to data/benchmarks/results.jsonl
+    python benchmark.py --scenarios chat --chats 200 --concurrency 16
+    python benchmark.py --label "batch size 40" --fail-on-regression
+
+The app runs in a scratch copy of the data files, so a run never touches the
+real tracker, audit log or coffee data. Each run is compared with the last
+stored run of the same configuration.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(REPO_DIR, "data", "benchmarks", "results.jsonl")
+SCRATCH_SKIP = {"jobs", "tracker", "benchmarks"}
+
+CHAT_QUESTIONS = [
+    "What PPE do I need for handling concentrated acids?",
+    "How often do I need to renew radiation safety training?",
+    "What should I do after a chemical spill in the lab?",
+    "Do I need laser safety training to align a class 4 laser?",
+    "Who has to take bloodborne pathogens training?",
+    "What is the procedure for an eyewash station check?"
+]
+# Safety and general questions reach the model; matching keywords ("ok", "match", "coffee"...) would hit canned replies
+COFFEE_MESSAGES = [
+    "What PPE should I wear in the chemistry lab?",
+    "Where are good study spots on campus?",
+    "How do I report a workplace hazard?",
+    "Any advice for my first week at Cal Poly?",
+    "Which fire extinguisher is right for an electrical fire?"
+]
+COFFEE_USERS = 20
+PROTOCOL_WORDS = (
+    "radiation x-ray chemical laser biological fire noise exposure dosimeter badge fume hood respirator goggles gloves "
+    "spill eyewash shower evacuation inspection supervisor training record waste container label storage ventilation "
+    "interlock shielding contamination decontamination emergency procedure annual refresher personnel area access"
+).split()
+
+def make_protocol_pdf(index: int, pages: int = 3, seed: str = "42") -> bytes:
+    """Minimal text PDF of a made-up protocol; every index gets different wording"""
+    rng = random.Random(f"{seed}:protocol:{index}")
+    page_lines = []
+    for page in range(pages):
+        lines = [f"{page + 1}. SECTION {index}-{page + 1} " + rng.choice(PROTOCOL_WORDS).upper()]
+        for _ in range(30):
+            lines.append(" ".join(rng.choice(PROTOCOL_WORDS) for _ in range(12)))
+        page_lines.append(lines)
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in page_lines:
+        text = "\n".join(f"({line}) Tj T*" for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td\n{text}\nET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    pdf, offsets = "%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n" + "".join(f"{o:010d} 00000 n \n" for o in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return pdf.encode("latin-1")
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 1)
+
+def prepare_scratch_dir() -> str:
+    """Copies the app's data files into a temporary working directory"""
+    scratch = tempfile.mkdtemp(prefix="ehs-benchmark-")
+    for name in os.listdir(REPO_DIR):
+        if name.endswith((".json", ".csv")):
+            shutil.copy2(os.path.join(REPO_DIR, name), scratch)
+    shutil.copytree(os.path.join(REPO_DIR, "data"), os.path.join(scratch, "data"),
+                    ignore=lambda directory, names: [n for n in names if n in SCRATCH_SKIP])
+    return scratch
+
+def seed_coffee_profiles(scratch: str, seed: str):
+    """Enhanced profiles without matches for the coffee users, so /coffee/chat gets past the profile and reminder branches"""
+    from coffee_scoring import synthetic_profiles
+
+    path = os.path.join(scratch, "enhanced_coffee_profiles.json")
+    profiles = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            profiles = json.load(f)
+    for i, profile in enumerate(synthetic_profiles(COFFEE_USERS, seed=seed)):
+        profile.update(name=f"Benchmark User {i}", availability=[], language="en")
+        profiles[profile["user_id"]] = profile
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profiles, f, ensure_ascii=False)
+
+def run_scenario(client, name: str, requests: list, concurrency: int) -> dict:
+    """Sends (path, data, files) requests on `concurrency` threads, returns latency, throughput and model-call figures"""
+    from bedrock_client import BedrockClient
+
+    before = BedrockClient.metrics.snapshot()
+    latencies, errors = [], 0
+
+    def send(request):
+        path, data, files = request
+        started = time.perf_counter()
+        response = client.post(path, data=data, files=files)
+        elapsed = time.perf_counter() - started
+        if response.headers.get("content-type", "").startswith("text/event-stream"):
+            ok = response.status_code == 200
+        else:
+            ok = response.status_code == 200 and response.json().get("success", True) is not False
+        return elapsed, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for elapsed, ok in executor.map(send, requests):
+            latencies.append(elapsed)
+            errors += 0 if ok else 1
+    wall = time.perf_counter() - started
+    after = BedrockClient.metrics.snapshot()
+
+    return {
+        "requests": len(requests),
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": percentile(latencies, 1.0),
+        "throughput_rps": round(len(requests) / wall, 2) if wall else 0.0,
+        "model_calls": after["calls"] - before["calls"],
+        "model_calls_per_request": round((after["calls"] - before["calls"]) / max(1, len(requests)), 2),
+        "throttles": after["throttles"] - before["throttles"],
+        "retries": after["retries"] - before["retries"],
+        "model_errors": after["errors"] - before["errors"],
+        "input_tokens": after["tokens"]["input"] - before["tokens"]["input"],
+        "output_tokens": after["tokens"]["output"] - before["tokens"]["output"]
+    }
+
+def build_requests(name: str, count: int, seed: str) -> list:
+    if name == "upload":
+        return [("/upload-pdf", {"refresh_cache": "true"}, {"file": (f"protocol-{i}.pdf", make_protocol_pdf(i, seed=seed), "application/pdf")})
+                for i in range(count)]
+    if name == "chat":
+        return [("/chat", {"message": CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)]}, None) for i in range(count)]
+    if name == "coffee":
+        # Every other request streams, so both the achat and the SSE branch are exercised
+        return [("/coffee/chat", {"user_id": f"bench{i % COFFEE_USERS:06d}", "message": COFFEE_MESSAGES[i % len(COFFEE_MESSAGES)],
+                                  "stream": "true" if i % 2 else "false"}, None)
+                for i in range(count)]
+    raise ValueError(f"Unknown scenario: {name}")
+
+def load_previous(config: dict) -> dict:
+    """Last stored run with the same configuration"""
+    if not os.path.exists(RESULTS_FILE):
+        return None
+    previous = None
+    with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                run = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if run.get("config") == config:
+                previous = run
+    return previous
+
+def compare(run: dict, previous: dict, tolerance: float) -> list:
+    """Prints a comparison table, returns regressions beyond the tolerance"""
+    regressions = []
+    print(f"\n{'scenario':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'calls/req':>11}{'errors':>8}")
+    for name, result in run["scenarios"].items():
+        print(f"{name:<10}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}"
+              f"{result['throughput_rps']:>10}{result['model_calls_per_request']:>11}{result['errors']:>8}")
+        old = (previous or {}).get("scenarios", {}).get(name)
+        if not old:
+            continue
+        changes = []
+        for field, higher_is_worse in (("p95_ms", True), ("p99_ms", True), ("throughput_rps", False), ("model_calls_per_request", True)):
+            if not old[field]:
+                continue
+            change = (result[field] - old[field]) / old[field]
+            changes.append(f"{field} {change:+.0%}")
+            if (change > tolerance) if higher_is_worse else (change < -tolerance):
+                regressions.append(f"{name} {field}: {old[field]} -> {result[field]}")
+        print(f"{'':<10}vs {previous['run_at'][:19]}: " + ", ".join(changes))
+    return regressions
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    except Exception:
+        return ""
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="upload,chat,coffee")
+    parser.add_argument("--uploads", type=int, default=6)
+    parser.add_argument("--chats", type=int, default=60)
+    parser.add_argument("--coffee-chats", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--throttle-rate", type=float, default=0.02)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", default="42")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change counted as a regression")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output")
+    args = parser.parse_args()
+
+    # The fake must be configured before the app creates its Bedrock clients
+    os.environ.update({
+        "BEDROCK_FAKE": "true",
+        "STUB_SEED": args.seed,
+        "STUB_LATENCY_MS": str(args.latency_ms),
+        "STUB_THROTTLE_RATE": str(args.throttle_rate),
+        "STUB_FAILURE_RATE": str(args.failure_rate),
+        "STUB_TOKEN_MS": "0",
+        "BEDROCK_BACKOFF_BASE": "0.05",
+        "AWS_ACCESS_KEY_ID": "fake",
+        "AWS_SECRET_ACCESS_KEY": "fake"
+    })
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    counts = {"upload": args.uploads, "chat": args.chats, "coffee": args.coffee_chats}
+    config = {
+        "scenarios": {name: counts[name] for name in scenarios},
+        "concurrency": args.concurrency,
+        "latency_ms": args.latency_ms,
+        "throttle_rate": args.throttle_rate,
+        "failure_rate": args.failure_rate,
+        "seed": args.seed
+    }
+
+    scratch = prepare_scratch_dir()
+    sys.path.insert(0, REPO_DIR)
+    seed_coffee_profiles(scratch, args.seed)
+    os.chdir(scratch)
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with quiet:
+            from fastapi.testclient import TestClient
+            import main_simple
+            from bedrock_stub import FakeBedrockRuntime
+
+            results = {}
+            with TestClient(main_simple.app) as client:
+                for name in scenarios:
+                    results[name] = run_scenario(client, name, build_requests(name, counts[name], args.seed), args.concurrency)
+            fake_counts = FakeBedrockRuntime.shared().get_counts()
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if "coffee" in results:
+        assert results["coffee"]["model_calls"] > 0, "coffee scenario made no model calls: /coffee/chat only hit canned replies"
+
+    run = {
+        "run_at": datetime.now().isoformat(),
+        "label": args.label,
+        "git_commit": git_commit(),
+        "config": config,
+        "scenarios": results,
+        "fake_bedrock": fake_counts
+    }
+    regressions = compare(run, load_previous(config), args.tolerance)
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        with open(RESULTS_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run, ensure_ascii=False) + "\n")
+        print(f"\nSaved to {os.path.relpath(RESULTS_FILE, REPO_DIR)}")
+
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        if args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
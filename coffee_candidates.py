@@ -0,0 +1,141 @@
+"""Candidate generation for coffee matching: score each profile only against its most promising partners.
+
+An inverted index maps interests, interest pairs, and (department, interest)
+and (department, trait) keys to profiles. Partners sharing the most keys with
+a profile are scored exactly and its top k become matching edges, so the
+work grows with n * candidates instead of n^2.
+
+    python coffee_candidates.py --benchmark 1000,10000,100000
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from itertools import combinations
+from typing import Dict, List, Tuple
+from coffee_scoring import CompatibilityMatrix
+
+CANDIDATES_PER_PROFILE = int(os.getenv('COFFEE_CANDIDATES_PER_PROFILE', '1000'))
+# Above this many active profiles create_ai_matches switches from the full matrix to candidates
+CANDIDATE_THRESHOLD = int(os.getenv('COFFEE_CANDIDATE_THRESHOLD', '3000'))
+
+def profile_keys(profile: Dict) -> List[tuple]:
+    """Index keys; a partner sharing more of them tends to score higher"""
+    interests = sorted(set(profile.get("interests", [])))
+    department = profile.get("department")
+    keys = [("one", interest) for interest in interests]
+    # Shared pairs mark the strongest interest overlap
+    keys += [("pair",) + pair for pair in combinations(interests, 2)]
+    keys += [("dept", department, interest) for interest in interests]
+    keys += [("trait", department, trait) for trait in set(profile.get("personality_traits", []))]
+    if not interests:
+        keys.append(("dept", department))
+    return keys
+
+class CandidateIndex:
+    def __init__(self, profiles: List[Dict]):
+        self.matrix = CompatibilityMatrix(profiles)
+        postings = {}
+        self._keys = []
+        for i, profile in enumerate(profiles):
+            keys = profile_keys(profile)
+            self._keys.append(keys)
+            for key in keys:
+                postings.setdefault(key, []).append(i)
+        self.postings = {key: np.array(ids, dtype=np.int64) for key, ids in postings.items()}
+
+    def candidates(self, i: int, max_candidates: int = None) -> np.ndarray:
+        """Profiles sharing the most index keys with profile i"""
+        max_candidates = max_candidates or CANDIDATES_PER_PROFILE
+        pool = np.concatenate([self.postings[key] for key in self._keys[i]])
+        ids, shared = np.unique(pool, return_counts=True)
+        keep = ids != i
+        ids, shared = ids[keep], shared[keep]
+        if len(ids) > max_candidates:
+            ids = ids[np.argpartition(-shared, max_candidates - 1)[:max_candidates]]
+        return ids
+
+    def top_partners(self, k: int = 32, max_candidates: int = None, block: int = 1000) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(rows, cols, scores) edges, rows < cols, linking every profile to its k best-scoring candidates"""
+        n = len(self.matrix)
+        edge_rows, edge_cols = [], []
+        for start in range(0, n, block):
+            queries, partners = [], []
+            for i in range(start, min(start + block, n)):
+                found = self.candidates(i, max_candidates)
+                queries.append(np.full(len(found), i, dtype=np.int64))
+                partners.append(found)
+            if not partners:
+                continue
+            queries, partners = np.concatenate(queries), np.concatenate(partners)
+            scores = self.matrix.pair_scores(queries, partners)
+            # Best k per query: sort by (query, -score), keep each query's first k
+            order = np.lexsort((-scores, queries))
+            queries, partners = queries[order], partners[order]
+            first = np.searchsorted(queries, queries, side="left")
+            keep = np.arange(len(queries)) - first < k
+            edge_rows.append(queries[keep])
+            edge_cols.append(partners[keep])
+
+        if not edge_rows:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty, np.array([], dtype=np.float64)
+        rows, cols = np.concatenate(edge_rows), np.concatenate(edge_cols)
+        keys = np.unique(np.minimum(rows, cols) * n + np.maximum(rows, cols))
+        rows, cols = keys // n, keys % n
+        return rows, cols, self.matrix.pair_scores(rows, cols)
+
+def run_benchmark(sizes: List[int], k: int = 32, queries: int = 200):
+    from coffee_scoring import synthetic_profiles
+    from enhanced_coffee import EnhancedCoffeeManager
+
+    print(f"{'profiles':>9}{'index s':>9}{'top-k s':>9}{'recall@' + str(k):>11}{'exhaustive s':>14}{'scalar s (est)':>16}")
+    for n in sizes:
+        profiles = synthetic_profiles(n)
+
+        started = time.perf_counter()
+        index = CandidateIndex(profiles)
+        index_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        rows, cols, _ = index.top_partners(k)
+        candidate_seconds = time.perf_counter() - started
+
+        # Ground truth for a sample of profiles: exact scores against everyone
+        partners = {}
+        for i, j in zip(rows.tolist(), cols.tolist()):
+            partners.setdefault(i, set()).add(j)
+            partners.setdefault(j, set()).add(i)
+        rng = np.random.default_rng(7)
+        sample = rng.choice(n, size=min(queries, n), replace=False)
+        everyone = np.arange(n)
+        started = time.perf_counter()
+        hits = 0
+        for i in sample.tolist():
+            row = index.matrix.pair_scores(np.full(n, i), everyone)
+            row[i] = -np.inf
+            kth = np.partition(row, n - k)[n - k]
+            # Tie-aware: a candidate scoring at least the true k-th best counts as a hit
+            hits += min(k, sum(1 for j in partners.get(i, ()) if row[j] >= kth))
+        exhaustive_seconds = (time.perf_counter() - started) / len(sample) * n
+
+        # calculate_compatibility_score over all pairs, extrapolated from a few rows
+        with tempfile.TemporaryDirectory() as scratch:
+            manager = EnhancedCoffeeManager(os.path.join(scratch, "profiles.json"), os.path.join(scratch, "matches.json"))
+        manager.profiles = {p["user_id"]: p for p in profiles}
+        ids = [p["user_id"] for p in profiles]
+        started = time.perf_counter()
+        rows_timed = 3
+        for i in range(rows_timed):
+            for other in ids:
+                manager.calculate_compatibility_score(ids[i], other)
+        scalar_seconds = (time.perf_counter() - started) / rows_timed * n / 2
+
+        print(f"{n:>9}{index_seconds:>9.2f}{candidate_seconds:>9.2f}{hits / (k * len(sample)):>11.1%}"
+              f"{exhaustive_seconds:>14.1f}{scalar_seconds:>16.1f}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--benchmark":
+        run_benchmark([int(n) for n in sys.argv[2].split(",")])
+    else:
+        print(__doc__)
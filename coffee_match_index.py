@@ -0,0 +1,121 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+def pair_key(user1_id: str, user2_id: str) -> Tuple[str, str]:
+    """Order-independent key of a pair of users"""
+    return (user1_id, user2_id) if user1_id <= user2_id else (user2_id, user1_id)
+
+def _created_at(match: Dict) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(match["created_at"].replace('Z', ''))
+    except (KeyError, AttributeError, ValueError):
+        return None
+
+class MatchIndex:
+    """Lookups over a manager's matches dict, kept in step with every insert and delete.
+
+    Holds one match per pair of users, the match ids of each user in creation
+    order, and the latest match time overall and per user, so "already
+    matched", "this user's matches" and "last match" never scan all matches.
+    """
+
+    def __init__(self):
+        self.pairs = {}  # pair_key -> match_id
+        self.by_user = {}  # user_id -> [match_id]
+        self.last_match_at = {}  # user_id -> datetime
+        self.latest = None
+
+    def rebuild(self, matches: Dict) -> List[str]:
+        """Indexes matches from scratch; returns ids of later matches repeating an indexed pair"""
+        self.__init__()
+        return [match_id for match_id, match in matches.items() if not self.add(match_id, match)]
+
+    def has_pair(self, user1_id: str, user2_id: str) -> bool:
+        return pair_key(user1_id, user2_id) in self.pairs
+
+    def add(self, match_id: str, match: Dict) -> bool:
+        """Indexes a match; False if its pair already has one"""
+        users = match["users"][:2]
+        key = pair_key(*users)
+        if self.pairs.get(key, match_id) != match_id:
+            return False
+        if key not in self.pairs:
+            self.pairs[key] = match_id
+            for user_id in users:
+                self.by_user.setdefault(user_id, []).append(match_id)
+
+        created_at = _created_at(match)
+        if created_at:
+            for user_id in users:
+                if user_id not in self.last_match_at or created_at > self.last_match_at[user_id]:
+                    self.last_match_at[user_id] = created_at
+            if not self.latest or created_at > self.latest:
+                self.latest = created_at
+        return True
+
+    def remove(self, match_id: str, match: Dict, matches: Dict):
+        """Drops a match already deleted from matches; times it set are recomputed from the remaining ones"""
+        users = match["users"][:2]
+        if self.pairs.get(pair_key(*users)) != match_id:
+            return
+        del self.pairs[pair_key(*users)]
+        for user_id in users:
+            ids = self.by_user.get(user_id, [])
+            if match_id in ids:
+                ids.remove(match_id)
+            if not ids:
+                self.by_user.pop(user_id, None)
+
+        created_at = _created_at(match)
+        if not created_at:
+            return
+        for user_id in users:
+            if self.last_match_at.get(user_id) == created_at:
+                times = [_created_at(matches[i]) for i in self.by_user.get(user_id, []) if i in matches]
+                times = [t for t in times if t]
+                if times:
+                    self.last_match_at[user_id] = max(times)
+                else:
+                    self.last_match_at.pop(user_id, None)
+        if self.latest == created_at:
+            self.latest = max(self.last_match_at.values(), default=None)
+
+    def user_match_ids(self, user_id: str) -> List[str]:
+        return list(self.by_user.get(user_id, []))
+
+class MatchIndexMixin:
+    """Match insert/delete for coffee managers keeping self.matches and self.match_index in step.
+
+    The manager provides matches, match_index, load_matches and save_matches.
+    """
+
+    def _index_matches(self) -> List[str]:
+        """Перестраивает индекс матчей; повторы уже встреченной пары удаляются из памяти"""
+        duplicates = self.match_index.rebuild(self.matches)
+        for match_id in duplicates:
+            del self.matches[match_id]
+        return duplicates
+
+    def add_match(self, match: Dict) -> bool:
+        """Добавляет матч, если у этой пары еще не было матча (без сохранения)"""
+        if self.match_index.pairs.get(pair_key(*match["users"][:2]), match["id"]) != match["id"]:
+            return False
+        # Матч с тем же id заменяется целиком
+        self.delete_match(match["id"])
+        self.match_index.add(match["id"], match)
+        self.matches[match["id"]] = match
+        return True
+
+    def delete_match(self, match_id: str) -> bool:
+        match = self.matches.pop(match_id, None)
+        if match is None:
+            return False
+        self.match_index.remove(match_id, match, self.matches)
+        return True
+
+    def remove_duplicate_matches(self) -> List[str]:
+        """Перечитывает матчи из файла и сохраняет их без повторных пар"""
+        self.matches = self.load_matches()
+        duplicates = self._index_matches()
+        self.save_matches()
+        return duplicates
@@ -0,0 +1,123 @@
+"""One-to-one weekly pairing that maximizes total compatibility.
+
+Small cohorts are matched exactly with the blossom algorithm (networkx);
+larger ones greedily over each user's best candidate partners, which keeps
+at least half of the optimal total and runs in O(n k log(n k)).
+
+    python coffee_matching.py --benchmark 50,100,150,300,1000,3000
+"""
+import os
+import sys
+import time
+import numpy as np
+from typing import List, Tuple
+
+MATCHING_MODE = os.getenv('COFFEE_MATCHING_MODE', 'auto')  # auto, optimal or greedy
+MATCHING_EXACT_MAX = int(os.getenv('COFFEE_MATCHING_EXACT_MAX', '50'))
+MATCHING_CANDIDATES = int(os.getenv('COFFEE_MATCHING_CANDIDATES', '32'))
+
+def edges_from_matrix(scores: np.ndarray, excluded: np.ndarray, per_node: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(rows, cols, weights) with rows < cols: every allowed pair, or only each node's per_node best partners"""
+    n = scores.shape[0]
+    allowed = ~excluded
+    np.fill_diagonal(allowed, False)
+    if per_node is None or per_node >= n - 1:
+        rows, cols = np.nonzero(np.triu(allowed, 1))
+    else:
+        masked = np.where(allowed, scores, -np.inf)
+        best = np.argpartition(-masked, per_node - 1, axis=1)[:, :per_node]
+        rows, cols = np.repeat(np.arange(n), per_node), best.ravel()
+        finite = np.isfinite(masked[rows, cols])
+        rows, cols = rows[finite], cols[finite]
+        keys = np.unique(np.minimum(rows, cols) * n + np.maximum(rows, cols))
+        rows, cols = keys // n, keys % n
+    return rows, cols, scores[rows, cols]
+
+def optimal_matching(rows: np.ndarray, cols: np.ndarray, weights: np.ndarray, max_cardinality: bool = False) -> List[Tuple[int, int]]:
+    """Maximum-weight matching (blossom); O(n^3), meant for small cohorts"""
+    try:
+        import networkx as nx
+    except ImportError:
+        print("networkx is not installed, falling back to greedy matching")
+        return greedy_matching(rows, cols, weights)
+    graph = nx.Graph()
+    graph.add_weighted_edges_from(zip(rows.tolist(), cols.tolist(), weights.tolist()))
+    return [tuple(sorted(pair)) for pair in nx.max_weight_matching(graph, maxcardinality=max_cardinality)]
+
+def greedy_matching(rows: np.ndarray, cols: np.ndarray, weights: np.ndarray) -> List[Tuple[int, int]]:
+    """Heaviest remaining edge first; ties in (row, col) order"""
+    order = np.lexsort((cols, rows, -weights))
+    used, pairs = set(), []
+    for k in order.tolist():
+        i, j = int(rows[k]), int(cols[k])
+        if i not in used and j not in used:
+            used.update((i, j))
+            pairs.append((i, j))
+    return pairs
+
+def _resolve_mode(n: int, mode: str = None, limit: int = None) -> str:
+    mode = mode or MATCHING_MODE
+    if mode == "auto":
+        # Only the best few pairs wanted: greedy takes the heaviest disjoint pairs first,
+        # a maximum matching may trade them away for total weight
+        small_limit = limit is not None and limit < n // 2
+        mode = "optimal" if n <= MATCHING_EXACT_MAX and not small_limit else "greedy"
+    return mode
+
+def match_edges(n: int, rows: np.ndarray, cols: np.ndarray, weights: np.ndarray, mode: str = None, max_cardinality: bool = False,
+                limit: int = None) -> List[Tuple[int, int, float]]:
+    """Disjoint (i, j, weight) pairs from an explicit edge list (rows < cols), best first; at most limit pairs"""
+    if _resolve_mode(n, mode, limit) == "optimal":
+        pairs = optimal_matching(rows, cols, weights, max_cardinality=max_cardinality)
+    else:
+        pairs = greedy_matching(rows, cols, weights)
+    weight = dict(zip(zip(rows.tolist(), cols.tolist()), weights.tolist()))
+    return sorted(((i, j, weight[(i, j)]) for i, j in pairs), key=lambda p: (-p[2], p[0], p[1]))[:limit]
+
+def weekly_pairs(scores: np.ndarray, excluded: np.ndarray, mode: str = None, max_cardinality: bool = False,
+                 limit: int = None) -> List[Tuple[int, int, float]]:
+    """Disjoint (i, j, score) pairs, best first; excluded marks pairs that must not meet (e.g. matched before)"""
+    n = scores.shape[0]
+    if _resolve_mode(n, mode, limit) == "optimal":
+        pairs = optimal_matching(*edges_from_matrix(scores, excluded), max_cardinality=max_cardinality)
+    else:
+        pairs = greedy_matching(*edges_from_matrix(scores, excluded, MATCHING_CANDIDATES))
+        # Users whose candidates were all taken get another pass among the unmatched
+        while limit is None or len(pairs) < limit:
+            matched = {u for pair in pairs for u in pair}
+            left = np.array([u for u in range(n) if u not in matched])
+            if len(left) < 2:
+                break
+            sub_rows, sub_cols, sub_weights = edges_from_matrix(scores[np.ix_(left, left)], excluded[np.ix_(left, left)], MATCHING_CANDIDATES)
+            extra = greedy_matching(sub_rows, sub_cols, sub_weights)
+            if not extra:
+                break
+            pairs += [tuple(sorted((int(left[i]), int(left[j])))) for i, j in extra]
+
+    return sorted(((i, j, float(scores[i, j])) for i, j in pairs), key=lambda p: (-p[2], p[0], p[1]))[:limit]
+
+def run_benchmark(sizes: List[int]):
+    from coffee_scoring import CompatibilityMatrix, synthetic_profiles
+
+    print(f"{'profiles':>9}{'mode':>9}{'pairs':>7}{'total score':>13}{'vs optimal':>12}{'seconds':>9}")
+    for n in sizes:
+        scores = CompatibilityMatrix(synthetic_profiles(n)).scores()
+        excluded = np.zeros(scores.shape, dtype=bool)
+        optimal_total = None
+        for mode in ("optimal", "greedy"):
+            # Blossom on a complete graph takes minutes beyond a few hundred profiles
+            if mode == "optimal" and n > 300:
+                continue
+            started = time.perf_counter()
+            pairs = weekly_pairs(scores, excluded, mode)
+            seconds = time.perf_counter() - started
+            total = sum(p[2] for p in pairs)
+            optimal_total = total if mode == "optimal" else optimal_total
+            ratio = f"{total / optimal_total:.2%}" if optimal_total else "-"
+            print(f"{n:>9}{mode:>9}{len(pairs):>7}{total:>13.2f}{ratio:>12}{seconds:>9.3f}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--benchmark":
+        run_benchmark([int(n) for n in sys.argv[2].split(",")])
+    else:
+        print(__doc__)
@@ -0,0 +1,119 @@
+import numpy as np
+from typing import Dict, List
+
+# Same weights as EnhancedCoffeeManager.calculate_compatibility_score
+INTEREST_WEIGHT = 0.4
+SAME_DEPARTMENT_SCORE, OTHER_DEPARTMENT_SCORE = 0.2, 0.1
+OTHER_ROLE_SCORE, SAME_ROLE_SCORE = 0.15, 0.05
+TRAIT_WEIGHT = 0.15
+AVAILABILITY_SCORE = 0.1
+
+def _binary_matrix(values: List[List[str]]) -> np.ndarray:
+    """One row per profile, one column per distinct value"""
+    vocabulary = {}
+    rows, cols = [], []
+    for row, items in enumerate(values):
+        for item in set(items):
+            rows.append(row)
+            cols.append(vocabulary.setdefault(item, len(vocabulary)))
+    matrix = np.zeros((len(values), max(len(vocabulary), 1)), dtype=np.float32)
+    matrix[rows, cols] = 1.0
+    return matrix
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def _pack_bits(binary: np.ndarray) -> np.ndarray:
+    """Binary matrix as rows of uint64 bitsets"""
+    packed = np.packbits(binary.astype(bool), axis=1)
+    padding = -packed.shape[1] % 8
+    if padding:
+        packed = np.pad(packed, ((0, 0), (0, padding)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+def _popcount_rows(words: np.ndarray) -> np.ndarray:
+    """Set bits per row of a uint64 matrix"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    return _POPCOUNT[words.view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+def _codes(values: List) -> np.ndarray:
+    """Categorical codes; missing values share a code, as None == None in the scalar score"""
+    codes = {}
+    return np.array([codes.setdefault(v, len(codes)) for v in values], dtype=np.int64)
+
+class CompatibilityMatrix:
+    """Pairwise compatibility of a set of profiles, computed with matrix operations.
+
+    Interests and traits become binary matrices, so every intersection size is
+    one matrix product (or a popcount over bitsets for sparse pair lists);
+    department and role become categorical codes. Scores are identical to
+    calculate_compatibility_score.
+    """
+
+    def __init__(self, profiles: List[Dict]):
+        self.user_ids = [p["user_id"] for p in profiles]
+        self.index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        self.interests = _binary_matrix([p.get("interests", []) for p in profiles])
+        self.traits = _binary_matrix([p.get("personality_traits", []) for p in profiles])
+        self.interest_bits = _pack_bits(self.interests)
+        self.trait_bits = _pack_bits(self.traits)
+        self.interest_counts = self.interests.sum(axis=1).astype(np.float64)
+        self.trait_counts = self.traits.sum(axis=1).astype(np.float64)
+        self.departments = _codes([p.get("department") for p in profiles])
+        self.roles = _codes([p.get("role") for p in profiles])
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @staticmethod
+    def _weighted_jaccard(inter: np.ndarray, size_a: np.ndarray, size_b: np.ndarray, weight: float) -> np.ndarray:
+        """inter / max(union, 1) * weight, in place on inter"""
+        union = size_a + size_b - inter
+        np.maximum(union, 1, out=union)
+        np.divide(inter, union, out=inter)
+        inter *= weight
+        return inter
+
+    def _combine(self, interest_inter, trait_inter, rows, cols) -> np.ndarray:
+        # Same operation order as the scalar version, so the floats match exactly
+        total = self._weighted_jaccard(interest_inter, self.interest_counts[rows], self.interest_counts[cols], INTEREST_WEIGHT)
+        total += np.where(self.departments[rows] == self.departments[cols], SAME_DEPARTMENT_SCORE, OTHER_DEPARTMENT_SCORE)
+        total += np.where(self.roles[rows] != self.roles[cols], OTHER_ROLE_SCORE, SAME_ROLE_SCORE)
+        total += self._weighted_jaccard(trait_inter, self.trait_counts[rows], self.trait_counts[cols], TRAIT_WEIGHT)
+        total += AVAILABILITY_SCORE
+        return np.minimum(total, 1.0, out=total)
+
+    def scores(self, block_rows: int = 512) -> np.ndarray:
+        """Full n x n score matrix, built in row blocks to bound the temporaries"""
+        n = len(self)
+        result = np.empty((n, n), dtype=np.float64)
+        cols = np.arange(n)
+        for start in range(0, n, block_rows):
+            rows = np.arange(start, min(start + block_rows, n))
+            interest_inter = (self.interests[rows] @ self.interests.T).astype(np.float64)
+            trait_inter = (self.traits[rows] @ self.traits.T).astype(np.float64)
+            result[rows] = self._combine(interest_inter, trait_inter, rows[:, None], cols[None, :])
+        return result
+
+    def pair_scores(self, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+        """Scores of the pairs (left[k], right[k]) only"""
+        interest_inter = _popcount_rows(self.interest_bits[left] & self.interest_bits[right]).astype(np.float64)
+        trait_inter = _popcount_rows(self.trait_bits[left] & self.trait_bits[right]).astype(np.float64)
+        return self._combine(interest_inter, trait_inter, left, right)
+
+def synthetic_profiles(count: int, seed: int = 42, interest_pool: int = 60, trait_pool: int = 15) -> List[Dict]:
+    """Random enhanced-coffee profiles for benchmarks"""
+    import random
+    rng = random.Random(seed)
+    interests = [f"interest-{i}" for i in range(interest_pool)]
+    traits = [f"trait-{i}" for i in range(trait_pool)]
+    departments = [f"Department {i}" for i in range(25)]
+    roles = ["student", "grad_student", "lab_tech", "researcher", "staff", "faculty"]
+    return [{
+        "user_id": f"bench{i:06d}",
+        "role": rng.choice(roles),
+        "department": rng.choice(departments),
+        "interests": rng.sample(interests, rng.randint(1, 8)),
+        "personality_traits": rng.sample(traits, rng.randint(0, 4)),
+        "active": True
+    } for i in range(count)]
@@ -0,0 +1,38 @@
+from typing import Dict, List, Set
+
+class CohortPlanner:
+    """Groups users by (role, department) so a protocol is analyzed once per cohort"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def plan(self, users: List[Dict]) -> List[Dict]:
+        """Splits users into cohorts, keeping roster order inside and across cohorts"""
+        cohorts = {}
+        for user in users:
+            key = (user.get('role', ''), user.get('department', ''))
+            if key not in cohorts:
+                cohorts[key] = {
+                    "cohort_id": f"{key[0]}|{key[1]}",
+                    "role": key[0],
+                    "department": key[1],
+                    "users": []
+                }
+            cohorts[key]["users"].append(user)
+        return list(cohorts.values())
+
+    def cohort_user_data(self, cohort: Dict) -> Dict:
+        """Representative user_data for BedrockClient.analyze_protocol"""
+        return {
+            "name": f"{len(cohort['users'])} users",
+            "role": cohort["role"],
+            "department": cohort["department"],
+            "cohort_size": len(cohort["users"]),
+            "completed_courses": []
+        }
+
+    def covered_courses(self, user_id: str, doc_tracker) -> Set[str]:
+        """Courses the user already completed or was assigned, locally or by earlier protocols"""
+        covered = set(self.db.get_user_courses(user_id))
+        covered.update(doc_tracker.get_all_user_courses(user_id))
+        return covered
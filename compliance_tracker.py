@@ -0,0 +1,166 @@
+import heapq
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+class ComplianceTracker:
+    """Compliance state per (user, course), kept current by events and a clock sweep.
+
+    Assignments and completions update one state row and the running counters.
+    Each row's warning time sits in a min-heap, so turning rows expired as time
+    passes only touches rows that are due. Upload workers write while request
+    handlers read, so every public method holds the lock.
+    """
+
+    def __init__(self, scheduler, buffer_days: int = 30):
+        self.scheduler = scheduler
+        self.buffer_days = buffer_days
+        self.states = {}  # (user_id, course_id) -> state row
+        self._by_course = {}  # course_id -> {(user_id, course_id)}
+        self._heap = []  # (warning_at, version, user_id, course_id)
+        self._expired_by_user = {}  # user_id -> {(user_id, course_id)} of expired rows
+        self._periods = {}  # course_periods snapshot the expiries were computed from
+        self._version = 0
+        self.counts = {"active": 0, "expired": 0, "critical": 0}
+        self._lock = threading.RLock()
+
+    def rebuild(self, assignment_logs: List[Dict], completions: List[Dict]):
+        """Full rebuild from the audit log and completion records (startup only)"""
+        with self._lock:
+            self.states = {}
+            self._by_course = {}
+            self._heap = []
+            self._expired_by_user = {}
+            self.counts = {"active": 0, "expired": 0, "critical": 0}
+            self._periods = dict(self.scheduler.course_periods)
+            for log in assignment_logs:
+                if log.get("user_id") and log.get("course_id"):
+                    self.record_assignment(log["user_id"], log["course_id"], log.get("timestamp", ""), log.get("priority", "normal"))
+            for completion in completions:
+                self.record_completion(completion["user_id"], completion["course_id"])
+
+    def record_assignment(self, user_id: str, course_id: str, assigned_at: str, priority: str = "normal"):
+        """New or renewed assignment; the latest one defines the pair's expiry"""
+        key = (user_id, course_id)
+        with self._lock:
+            state = self.states.get(key)
+            if state:
+                self._uncount(state)
+                state["assigned_at"] = assigned_at
+                state["priority"] = priority or "normal"
+                self._schedule(state)
+            else:
+                # The row is complete before readers can see it
+                state = {"user_id": user_id, "course_id": course_id, "completed": False,
+                         "assigned_at": assigned_at, "priority": priority or "normal"}
+                self._schedule(state)
+                self.states[key] = state
+                self._by_course.setdefault(course_id, set()).add(key)
+            self._count(state)
+            return state
+
+    def record_completion(self, user_id: str, course_id: str):
+        with self._lock:
+            state = self.states.get((user_id, course_id))
+            if state is None:
+                # Completed without an assignment in the log
+                state = self.record_assignment(user_id, course_id, "", "normal")
+            self._uncount(state)
+            state["completed"] = True
+            self._count(state)
+
+    def reschedule(self, course_id: str):
+        """Recomputes expiry of every pair of a course after its period changed"""
+        with self._lock:
+            self._periods[course_id] = self.scheduler.course_periods.get(course_id)
+            for key in self._by_course.get(course_id, ()):
+                state = self.states[key]
+                self._uncount(state)
+                self._schedule(state)
+                self._count(state)
+
+    def sweep(self, now: datetime = None):
+        """Picks up period changes, then expires rows whose warning time has passed"""
+        with self._lock:
+            periods = dict(self.scheduler.course_periods)
+            for course_id in set(periods) | set(self._periods):
+                if periods.get(course_id) != self._periods.get(course_id):
+                    self.reschedule(course_id)
+
+            now = (now or datetime.now()).timestamp()
+            while self._heap and self._heap[0][0] <= now:
+                _, version, user_id, course_id = heapq.heappop(self._heap)
+                state = self.states.get((user_id, course_id))
+                if state and state["version"] == version and not state["expired"]:
+                    self._uncount(state)
+                    self._set_expired(state, True)
+                    self._count(state)
+
+    def get_counts(self) -> Dict:
+        with self._lock:
+            self.sweep()
+            return dict(self.counts)
+
+    def get_state(self, user_id: str, course_id: str) -> Optional[Dict]:
+        """Copy of the row, safe to read after the lock is released"""
+        with self._lock:
+            self.sweep()
+            state = self.states.get((user_id, course_id))
+            return dict(state) if state else None
+
+    def get_expired_by_user(self) -> List[Dict]:
+        """Users with expiring courses, in the format of CourseScheduler.get_expired_courses"""
+        with self._lock:
+            self.sweep()
+            result = []
+            for user_id, keys in self._expired_by_user.items():
+                result.append({"user_id": user_id, "expired_courses": [{
+                    "course_id": self.states[key]["course_id"],
+                    "assigned_at": self.states[key]["assigned_at"],
+                    "period_months": self.scheduler.course_periods.get(key[1], 0)
+                } for key in keys]})
+            return result
+
+    def _schedule(self, state: Dict):
+        """Same rule as CourseScheduler.is_course_expired, evaluated once per change"""
+        self._version += 1
+        state["version"] = self._version
+        self._set_expired(state, False)
+        state["expires_at"] = None
+
+        period_months = self.scheduler.course_periods.get(state["course_id"])
+        if not period_months or not state["assigned_at"]:
+            return
+        try:
+            assigned = datetime.fromisoformat(state["assigned_at"].replace('Z', '+00:00'))
+        except ValueError:
+            return
+        if assigned.tzinfo:
+            assigned = assigned.astimezone().replace(tzinfo=None)
+
+        expiry_date = assigned + timedelta(days=period_months * 30)
+        state["expires_at"] = expiry_date.isoformat()
+        warning_at = (expiry_date - timedelta(days=self.buffer_days)).timestamp()
+        heapq.heappush(self._heap, (warning_at, state["version"], state["user_id"], state["course_id"]))
+
+    def _set_expired(self, state: Dict, expired: bool):
+        """Sets the flag and keeps the per-user expired index in step"""
+        state["expired"] = expired
+        user_id = state["user_id"]
+        key = (user_id, state["course_id"])
+        if expired:
+            self._expired_by_user.setdefault(user_id, set()).add(key)
+        elif key in self._expired_by_user.get(user_id, ()):
+            self._expired_by_user[user_id].discard(key)
+            if not self._expired_by_user[user_id]:
+                del self._expired_by_user[user_id]
+
+    def _count(self, state: Dict, delta: int = 1):
+        if state["completed"]:
+            return
+        self.counts["expired" if state["expired"] else "active"] += delta
+        if state["priority"] == "critical":
+            self.counts["critical"] += delta
+
+    def _uncount(self, state: Dict):
+        self._count(state, -1)
@@ -1,12 +1,16 @@
-import json
 import os
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
+from json_journal import JsonJournal
 
 class CourseCompletion:
     def __init__(self, completion_file="course_completions.json"):
         self.completion_file = completion_file
+        self.journal = JsonJournal(completion_file)
         self.completions = []
+        self._completed = {}  # (user_id, course_id) -> first completion
+        self._by_user = {}  # user_id -> [completion]
+        self._courses = {}  # course_id -> completion count
         self.load_completions()
     
     def complete_course(self, user_id: str, course_id: str, completion_method: str = "manual"):
@@ -20,43 +24,52 @@ class CourseCompletion:
         }
         
         self.completions.append(completion_entry)
-        self.save_completions()
+        self._index(completion_entry)
+        self.journal.append(len(self.completions) - 1, completion_entry)
+        self.journal.sync()
+        if self.journal.needs_compaction():
+            self.journal.compact(self.completions)
         return completion_entry
     
     def is_course_completed(self, user_id: str, course_id: str) -> bool:
         """Проверяет, пройден ли курс пользователем"""
-        return any(
-            c["user_id"] == user_id and c["course_id"] == course_id 
-            for c in self.completions
-        )
+        return (user_id, course_id) in self._completed
+    
+    def get_completion(self, user_id: str, course_id: str) -> Optional[Dict]:
+        """Первое завершение курса пользователем"""
+        return self._completed.get((user_id, course_id))
     
     def get_user_completions(self, user_id: str) -> List[Dict]:
         """Получает все завершенные курсы user"""
-        return [c for c in self.completions if c["user_id"] == user_id]
+        return list(self._by_user.get(user_id, []))
     
     def get_completion_stats(self) -> Dict:
         """Получает статистику завершений"""
-        total_completions = len(self.completions)
-        unique_users = len(set(c["user_id"] for c in self.completions))
-        unique_courses = len(set(c["course_id"] for c in self.completions))
-        
         return {
-            "total_completions": total_completions,
-            "unique_users": unique_users,
-            "unique_courses": unique_courses
+            "total_completions": len(self.completions),
+            "unique_users": len(self._by_user),
+            "unique_courses": len(self._courses)
         }
     
     def save_completions(self):
-        """Сохраняет завершения в файл"""
-        with open(self.completion_file, 'w', encoding='utf-8') as f:
-            json.dump(self.completions, f, ensure_ascii=False, indent=2)
+        """Сохраняет завершения в файл (snapshot, journal is folded in)"""
+        self.journal.compact(self.completions)
+    
+    def close(self):
+        self.journal.close()
+    
+    def _index(self, completion: Dict):
+        self._completed.setdefault((completion["user_id"], completion["course_id"]), completion)
+        self._by_user.setdefault(completion["user_id"], []).append(completion)
+        self._courses[completion["course_id"]] = self._courses.get(completion["course_id"], 0) + 1
     
     def load_completions(self):
-        """Загружает завершения из file"""
-        if os.path.exists(self.completion_file):
+        """Загружает завершения из file и журнала"""
+        if os.path.exists(self.completion_file) or os.path.exists(self.journal.journal_file):
             try:
-                with open(self.completion_file, 'r', encoding='utf-8') as f:
-                    self.completions = json.load(f)
+                self.completions = self.journal.load()
             except Exception as e:
                 print(f"Error loading завершений: {e}")
-                self.completions = []
\ No newline at end of file
+                self.completions = []
+        for completion in self.completions:
+            self._index(completion)
\ No newline at end of file
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+class DecisionCache:
+    """Persistent cache of Bedrock protocol decisions, keyed by prompt content"""
+
+    def __init__(self, cache_file="decision_cache.json", ttl_seconds: int = None, max_entries: int = None):
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv('DECISION_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('DECISION_CACHE_MAX_ENTRIES', '5000'))
+        self.entries = {}  # key -> {"decision", "created_at", "last_used"}, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._dirty = False  # entries put with save=False and not yet written
+        self._lock = threading.Lock()
+        self.load_cache()
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Collapses whitespace and case so re-exported copies of a protocol hash the same"""
+        return re.sub(r'\s+', ' ', text or '').strip().lower()
+
+    @staticmethod
+    def catalog_version(courses: List[Dict]) -> str:
+        """Short hash of the course catalog, changes whenever a course is added or edited"""
+        catalog = sorted(f"{c.get('course_id', '')}:{c.get('description', '')}" for c in courses)
+        return hashlib.sha256("\n".join(catalog).encode()).hexdigest()[:16]
+
+    def make_key(self, model_id: str, protocol_text: str, user_context: str, catalog_version: str) -> str:
+        parts = [model_id, self.normalize_text(protocol_text), self.normalize_text(user_context), catalog_version]
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry and not self._is_expired(entry, time.time()):
+                entry["last_used"] = time.time()
+                # Move to the end: dict order is the LRU order
+                self.entries[key] = self.entries.pop(key)
+                self.hits += 1
+                return entry["decision"]
+            if entry:
+                del self.entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: str, decision: Dict, save: bool = True):
+        """Stores a decision; with save=False the file is written by the next flush(), once per analysis run"""
+        with self._lock:
+            now = time.time()
+            self.entries.pop(key, None)
+            self.entries[key] = {"decision": decision, "created_at": now, "last_used": now}
+            # Only the overflow is evicted here, expired entries go lazily in get() and flush()
+            while len(self.entries) > self.max_entries:
+                del self.entries[next(iter(self.entries))]
+                self.evictions += 1
+            if save:
+                self.save_cache()
+            else:
+                self._dirty = True
+
+    def flush(self):
+        """Writes entries put with save=False and drops expired ones"""
+        with self._lock:
+            if self._dirty:
+                self._evict(time.time())
+                self.save_cache()
+
+    def clear(self):
+        with self._lock:
+            self.entries = {}
+            self.save_cache()
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries
+        }
+
+    def _is_expired(self, entry: Dict, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry["created_at"] > self.ttl_seconds
+
+    def _evict(self, now: float):
+        """Drops expired entries, then least recently used ones above max_entries"""
+        expired = [k for k, e in self.entries.items() if self._is_expired(e, now)]
+        for key in expired:
+            del self.entries[key]
+        overflow = max(0, len(self.entries) - self.max_entries)
+        for key in list(self.entries)[:overflow]:
+            del self.entries[key]
+        self.evictions += len(expired) + overflow
+
+    def save_cache(self):
+        """Saves cache to file (atomically, readers never see a half-written file)"""
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_file, self.cache_file)
+        self._dirty = False
+
+    def load_cache(self):
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+                # Files written before the LRU order was kept are sorted once
+                self.entries = dict(sorted(entries.items(), key=lambda item: item[1]["last_used"]))
+                self._evict(time.time())
+                self.evictions = 0
+            except Exception as e:
+                print(f"Error loading decision cache: {e}")
+                self.entries = {}
@@ -0,0 +1,91 @@
+import hashlib
+import re
+from typing import List, Optional, Tuple
+
+EMPTY_BIN = (1 << 32) - 1
+
+class MinHashIndex:
+    """MinHash signatures over word shingles with LSH banding for sublinear near-duplicate lookup.
+
+    Signatures use one-permutation hashing: each shingle hash falls into one of
+    num_perm bins and each bin keeps its minimum, so a signature costs one pass
+    over the shingles instead of num_perm passes.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 5):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.signatures = {}  # doc_id -> signature
+        self._buckets = {}  # (band, band values) -> {doc_id}
+
+    def shingles(self, text: str) -> set:
+        """64-bit hashes of overlapping word n-grams, case and whitespace insensitive"""
+        words = re.findall(r"\w+", (text or "").lower())
+        if len(words) < self.shingle_size:
+            words = words + [""] * (self.shingle_size - len(words))
+        return {
+            int.from_bytes(hashlib.blake2b(" ".join(words[i:i + self.shingle_size]).encode(), digest_size=8).digest(), "big")
+            for i in range(len(words) - self.shingle_size + 1)
+        }
+
+    def signature(self, text: str) -> List[int]:
+        bins = [EMPTY_BIN] * self.num_perm
+        for h in self.shingles(text):
+            index, value = h % self.num_perm, (h >> 32) & EMPTY_BIN
+            if value < bins[index]:
+                bins[index] = value
+        # Empty bins borrow the next filled bin so short documents still compare fairly
+        filled = [i for i, v in enumerate(bins) if v != EMPTY_BIN]
+        if filled:
+            for i, value in enumerate(bins):
+                if value == EMPTY_BIN:
+                    source = next((j for j in filled if j > i), filled[0])
+                    bins[i] = bins[source]
+        return bins
+
+    @staticmethod
+    def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+        """Estimated Jaccard similarity of the shingle sets"""
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+    @staticmethod
+    def encode(signature: List[int]) -> str:
+        return "".join(f"{v:08x}" for v in signature)
+
+    @staticmethod
+    def decode(encoded: str) -> List[int]:
+        return [int(encoded[i:i + 8], 16) for i in range(0, len(encoded), 8)]
+
+    def add(self, doc_id: str, signature: List[int]):
+        if len(signature) != self.num_perm:
+            return
+        self.remove(doc_id)
+        self.signatures[doc_id] = signature
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id: str):
+        signature = self.signatures.pop(doc_id, None)
+        if signature:
+            for key in self._band_keys(signature):
+                self._buckets.get(key, set()).discard(doc_id)
+
+    def query(self, signature: List[int], threshold: float = 0.5) -> List[Tuple[str, float]]:
+        """(doc_id, similarity) of indexed documents sharing an LSH band, best first"""
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+        scored = [(doc_id, self.similarity(signature, self.signatures[doc_id])) for doc_id in candidates]
+        return sorted([s for s in scored if s[1] >= threshold], key=lambda s: s[1], reverse=True)
+
+    def best_match(self, signature: List[int], threshold: float = 0.5) -> Optional[Tuple[str, float]]:
+        matches = self.query(signature, threshold)
+        return matches[0] if matches else None
+
+    def _band_keys(self, signature: List[int]):
+        for band in range(self.bands):
+            yield (band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
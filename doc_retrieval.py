@@ -0,0 +1,155 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List
+from prompt_segments import estimate_tokens
+from protocol_chunker import chunk_protocol
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "if", "in",
+    "is", "it", "my", "of", "on", "or", "should", "that", "the", "this", "to", "what", "when", "where", "which",
+    "who", "with", "you"
+}
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"\w+", (text or "").lower()) if t not in STOPWORDS and len(t) > 1]
+
+def _find_span(text: str, chunk_text: str, cursor: int):
+    """(start, end) of the chunk in text; chunks are section pieces joined by blank lines, found in order"""
+    start = end = None
+    position = cursor
+    for part in chunk_text.split("\n\n"):
+        if not part:
+            continue
+        found = text.find(part, position)
+        if found < 0:
+            return None
+        start = found if start is None else start
+        end = position = found + len(part)
+    return (start, end) if start is not None else None
+
+class DocumentRetriever:
+    """BM25 index over chunks of the processed protocols, used to ground /chat.
+
+    Documents are indexed lazily: each search first indexes documents the
+    tracker saved since the last one, so only the new text is ever read.
+    Chunks keep only their span in the stored blob; the text of the top hits
+    is read back when a context is built.
+    """
+
+    def __init__(self, doc_tracker, chunk_chars: int = None, k1: float = 1.5, b: float = 0.75):
+        self.doc_tracker = doc_tracker
+        self.chunk_chars = chunk_chars or int(os.getenv('RETRIEVAL_CHUNK_CHARS', '1200'))
+        self.k1 = k1
+        self.b = b
+        self.chunks = {}  # chunk_id -> {doc_hash, title, content_hash, start, end, length} (text only without a blob)
+        self.postings = {}  # term -> {chunk_id: term frequency}
+        self._doc_chunks = {}  # doc_hash -> [chunk_id]
+        self._total_length = 0
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    def add_document(self, doc_hash: str, title: str, text: str, content_hash: str = None):
+        """Indexes text; with content_hash (its blob in the tracker store) chunk text is not kept in memory"""
+        self.remove_document(doc_hash)
+        chunk_ids = []
+        cursor = 0
+        for chunk in chunk_protocol(text, self.chunk_chars) or [{"text": title}]:
+            terms = Counter(tokenize(chunk["text"]))
+            if not terms:
+                continue
+            chunk_id = self._next_id
+            self._next_id += 1
+            length = sum(terms.values())
+            entry = {"doc_hash": doc_hash, "title": title, "length": length}
+            span = _find_span(text, chunk["text"], cursor) if content_hash else None
+            if span:
+                entry.update(content_hash=content_hash, start=span[0], end=span[1])
+                cursor = span[1]
+            else:
+                entry["text"] = chunk["text"]
+            self.chunks[chunk_id] = entry
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[chunk_id] = tf
+            self._total_length += length
+            chunk_ids.append(chunk_id)
+        self._doc_chunks[doc_hash] = chunk_ids
+
+    def remove_document(self, doc_hash: str):
+        blobs = {}
+        for chunk_id in self._doc_chunks.pop(doc_hash, []):
+            chunk = self.chunks.pop(chunk_id)
+            self._total_length -= chunk["length"]
+            for term in set(tokenize(self._chunk_text(chunk, blobs))):
+                postings = self.postings.get(term, {})
+                postings.pop(chunk_id, None)
+                if not postings:
+                    self.postings.pop(term, None)
+
+    def sync(self):
+        """Indexes documents saved since the last call"""
+        with self._lock:
+            for doc_hash in list(self.doc_tracker.processed_docs):
+                if doc_hash in self._doc_chunks:
+                    continue
+                doc_info = self.doc_tracker.processed_docs[doc_hash]
+                content = self.doc_tracker.get_content(doc_hash)
+                if content:
+                    self.add_document(doc_hash, doc_info.get("title", ""), content, doc_info.get("content_hash"))
+                else:
+                    # Legacy documents without stored text are still findable by title
+                    self.add_document(doc_hash, doc_info.get("title", ""), doc_info.get("excerpt") or doc_info.get("title", ""))
+
+    def _chunk_text(self, chunk: Dict, blobs: Dict) -> str:
+        """Chunk text, read from its blob (once per call, via blobs) when not kept in memory"""
+        if "text" in chunk:
+            return chunk["text"]
+        content_hash = chunk["content_hash"]
+        if content_hash not in blobs:
+            blobs[content_hash] = self.doc_tracker.store.read_blob(content_hash) or ""
+        return blobs[content_hash][chunk["start"]:chunk["end"]]
+
+    def search(self, query: str, k: int = 5) -> List[Dict]:
+        """Top k chunks by BM25 score, best first"""
+        with self._lock:
+            self.sync()
+            if not self.chunks:
+                return []
+            count = len(self.chunks)
+            avg_length = self._total_length / count
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    if chunk_id not in self.chunks:
+                        continue  # a removed chunk whose blob slice no longer tokenizes the same
+                    norm = self.k1 * (1 - self.b + self.b * self.chunks[chunk_id]["length"] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            best = sorted(scores.items(), key=lambda s: s[1], reverse=True)[:k]
+            blobs = {}
+            return [{"doc_hash": self.chunks[i]["doc_hash"], "title": self.chunks[i]["title"],
+                     "text": self._chunk_text(self.chunks[i], blobs), "score": round(score, 3)} for i, score in best]
+
+    def build_context(self, query: str, k: int = None, max_tokens: int = None) -> Dict:
+        """Prompt context of the top chunks within a token budget"""
+        k = k or int(os.getenv('RETRIEVAL_TOP_K', '5'))
+        max_tokens = max_tokens or int(os.getenv('RETRIEVAL_MAX_TOKENS', '1500'))
+        parts, sources, used = [], [], 0
+        for hit in self.search(query, k):
+            block = f"Document: {hit['title']}\n{hit['text']}"
+            tokens = estimate_tokens(block)
+            if used + tokens > max_tokens:
+                if parts:
+                    break
+                # The best chunk alone is over budget: cut it rather than send nothing
+                block = block[:max_tokens * 4]
+                tokens = estimate_tokens(block)
+            parts.append(block)
+            used += tokens
+            sources.append({"doc_hash": hit["doc_hash"], "title": hit["title"], "score": hit["score"]})
+        return {"text": "\n\n".join(parts), "sources": sources, "tokens": used}
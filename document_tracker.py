@@ -3,46 +3,110 @@ import json
 import os
 from datetime import datetime
 from typing import Dict, List, Optional
+from doc_fingerprint import MinHashIndex
+from protocol_chunker import diff_sections, section_hashes
+from tracker_store import TrackerStore
 
 class DocumentTracker:
-    def __init__(self, data_file="tracker_data.json"):
-        self.data_file = data_file
-        self.processed_docs = {}  # hash -> document info
-        self.assignment_history = {}  # user_id -> list of assignments
+    def __init__(self, data_dir="data/tracker", legacy_file="tracker_data.json"):
+        self.store = TrackerStore(data_dir)
+        self.legacy_file = legacy_file  # single-file format, migrated on first start
+        self.processed_docs = {}  # hash -> document metadata (text, sections and history live in the store)
+        self._history = {}  # user_id -> list of assignments, loaded per user on first use
+        self.fingerprints = MinHashIndex()  # near-duplicate lookup over whole documents
+        self.revision_threshold = float(os.getenv('REVISION_SIMILARITY', '0.5'))
         self.load_data()
     
     def get_document_hash(self, text: str) -> str:
-        """Creates document hash for duplicate detection"""
-        # Take first 1000 characters for hashing
-        content = text[:1000].strip().lower()
+        """Creates document hash for exact duplicate detection"""
+        # The whole text: an edit anywhere makes a new document, which find_revision then diffs
+        content = text.strip().lower()
         return hashlib.md5(content.encode()).hexdigest()
     
-    def is_duplicate(self, text: str) -> tuple[bool, Optional[Dict]]:
-        """Checks if document was processed before"""
+    @staticmethod
+    def get_legacy_hash(text: str) -> str:
+        """Key of documents saved before whole-text hashing: first 1000 characters only"""
+        return hashlib.md5(text[:1000].strip().lower().encode()).hexdigest()
+    
+    def find_duplicate(self, text: str) -> Optional[str]:
+        """Hash of the already processed document with this exact text"""
         doc_hash = self.get_document_hash(text)
         if doc_hash in self.processed_docs:
+            return doc_hash
+        # Legacy entries often have no stored text, so find_revision cannot match them
+        legacy_hash = self.get_legacy_hash(text)
+        legacy = self.processed_docs.get(legacy_hash)
+        if legacy is not None and not legacy.get("content_hash"):
+            return legacy_hash
+        return None
+    
+    def is_duplicate(self, text: str) -> tuple[bool, Optional[Dict]]:
+        """Checks if document was processed before"""
+        doc_hash = self.find_duplicate(text)
+        if doc_hash:
             return True, self.processed_docs[doc_hash]
         return False, None
     
-    def save_document(self, text: str, assignments: List[Dict], skipped_duplicates: List[Dict] = None) -> str:
+    def get_document_summary(self, doc_hash: str) -> Optional[Dict]:
+        """Document info without text, fingerprint and section hashes"""
+        doc_info = self.processed_docs.get(doc_hash)
+        if doc_info is None:
+            return None
+        return {k: v for k, v in doc_info.items() if k not in ("minhash", "content_hash")}
+    
+    def get_content(self, doc_hash: str) -> Optional[str]:
+        """Full protocol text, read from its blob on demand"""
+        content_hash = self.processed_docs.get(doc_hash, {}).get("content_hash")
+        return self.store.read_blob(content_hash) if content_hash else None
+    
+    def find_revision(self, text: str) -> Optional[Dict]:
+        """Closest processed document sharing most shingles with text, with a section diff against it"""
+        signature = self.fingerprints.signature(text)
+        match = self.fingerprints.best_match(signature, self.revision_threshold)
+        if not match:
+            return None
+        
+        doc_hash, similarity = match
+        doc_info = self.processed_docs.get(doc_hash, {})
+        old_sections = self.store.read_sections(doc_hash)
+        if old_sections is None:
+            content = self.get_content(doc_hash)
+            old_sections = section_hashes(content) if content else None
+        return {
+            "document_hash": doc_hash,
+            "title": doc_info.get("title", ""),
+            "processed_at": doc_info.get("processed_at"),
+            "similarity": round(similarity, 3),
+            "diff": diff_sections(old_sections, text) if old_sections is not None else None
+        }
+    
+    def save_document(self, text: str, assignments: List[Dict], skipped_duplicates: List[Dict] = None, revision_of: str = None,
+                      requirements: Dict = None) -> str:
         """Saves information about processed document"""
         doc_hash = self.get_document_hash(text)
+        signature = self.fingerprints.signature(text)
         
         self.processed_docs[doc_hash] = {
             "processed_at": datetime.now().isoformat(),
             "title": text[:100] + "..." if len(text) > 100 else text,
+            "excerpt": text[:500],
+            "content_hash": self.store.write_blob(text),
             "assignments_count": len(assignments),
             "assigned_users": [a["user_id"] for a in assignments],
-            "skipped_duplicates": skipped_duplicates or []
+            "skipped_duplicates": skipped_duplicates or [],
+            "minhash": MinHashIndex.encode(signature)
         }
+        self.store.write_sections(doc_hash, section_hashes(text))
+        if revision_of:
+            self.processed_docs[doc_hash]["revision_of"] = revision_of
+        if requirements:
+            # Extracted hazards/training, a later revision only re-decides on what is new
+            self.processed_docs[doc_hash]["requirements"] = requirements
+        self.fingerprints.add(doc_hash, signature)
         
-        # Save assignment history for each user
+        # Save assignment history for each user (one appended line each)
         for assignment in assignments:
-            user_id = assignment["user_id"]
-            if user_id not in self.assignment_history:
-                self.assignment_history[user_id] = []
-            
-            self.assignment_history[user_id].append({
+            self._add_assignment(assignment["user_id"], {
                 "document_hash": doc_hash,
                 "courses": assignment["courses_assigned"],
                 "assigned_at": datetime.now().isoformat(),
@@ -54,7 +118,18 @@ class DocumentTracker:
     
     def get_user_history(self, user_id: str) -> List[Dict]:
         """Получает историю назначений для user"""
-        return self.assignment_history.get(user_id, [])
+        if user_id not in self._history:
+            self._history[user_id] = self.store.read_assignments(user_id)
+        return self._history[user_id]
+    
+    @property
+    def assignment_history(self) -> Dict[str, List[Dict]]:
+        """All users' histories; loads every user file, prefer get_user_history"""
+        return {user_id: self.get_user_history(user_id) for user_id in self.store.list_users()}
+    
+    def _add_assignment(self, user_id: str, record: Dict):
+        self.get_user_history(user_id).append(record)
+        self.store.append_assignment(user_id, record)
     
     def has_recent_assignment(self, user_id: str, course_id: str, days: int = 30) -> bool:
         """Проверяет, назначался ли курс пользователю недавно"""
@@ -76,23 +151,47 @@ class DocumentTracker:
         return all_courses
     
     def save_data(self):
-        """Сохраняет данные в файл"""
-        data = {
-            "processed_docs": self.processed_docs,
-            "assignment_history": self.assignment_history
-        }
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        """Сохраняет метаданные документов (text and history are written as they arrive)"""
+        self.store.save_documents(self.processed_docs)
     
     def load_data(self):
-        """Загружает данные из file"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.processed_docs = data.get("processed_docs", {})
-                    self.assignment_history = data.get("assignment_history", {})
-            except Exception as e:
-                print(f"Error loading data: {e}")
-                self.processed_docs = {}
-                self.assignment_history = {}
\ No newline at end of file
+        """Загружает метаданные; text, sections and user history stay on disk until needed"""
+        try:
+            if not self.store.exists() and os.path.exists(self.legacy_file):
+                self.migrate_legacy()
+            self.processed_docs = self.store.load_documents()
+        except Exception as e:
+            print(f"Error loading data: {e}")
+            self.processed_docs = {}
+        
+        for doc_hash, doc_info in self.processed_docs.items():
+            if doc_info.get("minhash"):
+                self.fingerprints.add(doc_hash, MinHashIndex.decode(doc_info["minhash"]))
+    
+    def migrate_legacy(self):
+        """Splits tracker_data.json into the store layout; the old file is left in place"""
+        with open(self.legacy_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        documents = {}
+        for doc_hash, doc_info in data.get("processed_docs", {}).items():
+            doc_info = dict(doc_info)
+            content = doc_info.pop("content", None)
+            sections = doc_info.pop("sections", None)
+            if content:
+                doc_info["excerpt"] = content[:500]
+                doc_info["content_hash"] = self.store.write_blob(content)
+                sections = sections or section_hashes(content)
+                if not doc_info.get("minhash"):
+                    doc_info["minhash"] = MinHashIndex.encode(self.fingerprints.signature(content))
+            if sections:
+                self.store.write_sections(doc_hash, sections)
+            documents[doc_hash] = doc_info
+        
+        for user_id, history in data.get("assignment_history", {}).items():
+            for record in history:
+                self.store.append_assignment(user_id, record)
+        
+        # Metadata goes last: a crash mid-migration simply migrates again
+        self.store.save_documents(documents)
+        print(f"Migrated {len(documents)} documents from {self.legacy_file} to {self.store.data_dir}")
\ No newline at end of file
@@ -1,15 +1,24 @@
 import json
+import threading
 import uuid
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import random
+import numpy as np
+from coffee_candidates import CANDIDATE_THRESHOLD, CandidateIndex
+from coffee_match_index import MatchIndex, MatchIndexMixin
+from coffee_matching import MATCHING_CANDIDATES, match_edges, weekly_pairs
+from coffee_scoring import CompatibilityMatrix
 
-class EnhancedCoffeeManager:
+class EnhancedCoffeeManager(MatchIndexMixin):
     def __init__(self, data_file="enhanced_coffee_profiles.json", matches_file="enhanced_coffee_matches.json"):
         self.data_file = data_file
         self.matches_file = matches_file
         self.profiles = self.load_profiles()
         self.matches = self.load_matches()
+        self.match_index = MatchIndex()
+        self._index_matches()
+        self._create_lock = threading.Lock()  # matching runs in worker threads
     
     def load_profiles(self) -> Dict:
         try:
@@ -107,12 +116,8 @@ class EnhancedCoffeeManager:
         
         now = datetime.now()
         
-        # Получаем последний матч любого пользователя
-        latest_match = None
-        for match in self.matches.values():
-            match_date = datetime.fromisoformat(match["created_at"].replace('Z', ''))
-            if not latest_match or match_date > latest_match:
-                latest_match = match_date
+        # Последний матч любого пользователя
+        latest_match = self.match_index.latest
         
         if latest_match:
             # Проверяем, прошла ли неделя с последнего матча
@@ -127,6 +132,10 @@ class EnhancedCoffeeManager:
         return True, "", ""
     
     def create_ai_matches(self, max_matches: int = 20, user_id: str = None) -> List[Dict]:
+        with self._create_lock:
+            return self._create_ai_matches(max_matches, user_id)
+    
+    def _create_ai_matches(self, max_matches: int, user_id: str = None) -> List[Dict]:
         # Проверяем еженедельное ограничение
         can_create, message, _ = self.can_create_matches(user_id)
         if not can_create:
@@ -137,31 +146,40 @@ class EnhancedCoffeeManager:
         if len(active_profiles) < 2:
             return []
         
-        # Получаем существующие пары пользователей
-        existing_pairs = set()
-        for match in self.matches.values():
-            users = sorted(match["users"])
-            existing_pairs.add((users[0], users[1]))
+        if len(active_profiles) > CANDIDATE_THRESHOLD:
+            # Полная матрица n^2 слишком велика: оцениваются только лучшие кандидаты каждого
+            index = CandidateIndex(active_profiles)
+            matrix = index.matrix
+        else:
+            # Совместимость всех пар одной матричной операцией
+            matrix = CompatibilityMatrix(active_profiles)
+        
+        # Каждый пользователь максимум в одной паре, суммарная совместимость максимальна;
+        # пары, у которых уже был матч, исключаются; breakdown считается только для выбранных пар
+        if len(active_profiles) > CANDIDATE_THRESHOLD:
+            rows, cols, weights = index.top_partners(MATCHING_CANDIDATES)
+            user_ids = matrix.user_ids
+            keep = np.array([not self.match_index.has_pair(user_ids[i], user_ids[j])
+                             for i, j in zip(rows.tolist(), cols.tolist())], dtype=bool)
+            pairs = match_edges(len(matrix), rows[keep], cols[keep], weights[keep], limit=max_matches)
+        else:
+            scores = matrix.scores()
+            excluded = np.zeros(scores.shape, dtype=bool)
+            for user1_id, user2_id in self.match_index.pairs:
+                i, j = matrix.index.get(user1_id), matrix.index.get(user2_id)
+                if i is not None and j is not None:
+                    excluded[i, j] = excluded[j, i] = True
+            pairs = weekly_pairs(scores, excluded, limit=max_matches)
         
-        # Вычисляем совместимость для всех пар (исключая существующие)
         compatibility_pairs = []
-        for i, profile1 in enumerate(active_profiles):
-            for profile2 in active_profiles[i+1:]:
-                user1_id = profile1["user_id"]
-                user2_id = profile2["user_id"]
-                
-                # Проверяем, что эта пара еще не существует
-                pair_key = tuple(sorted([user1_id, user2_id]))
-                if pair_key not in existing_pairs:
-                    score, breakdown = self.calculate_compatibility_score(user1_id, user2_id)
-                    compatibility_pairs.append({
-                        "users": [user1_id, user2_id],
-                        "score": score,
-                        "breakdown": breakdown
-                    })
-        
-        # Сортируем по совместимости
-        compatibility_pairs.sort(key=lambda x: x["score"], reverse=True)
+        for i, j, _ in pairs:
+            user1_id, user2_id = matrix.user_ids[i], matrix.user_ids[j]
+            score, breakdown = self.calculate_compatibility_score(user1_id, user2_id)
+            compatibility_pairs.append({
+                "users": [user1_id, user2_id],
+                "score": score,
+                "breakdown": breakdown
+            })
         
         # Создаем матчи (только новые пары)
         matches = []
@@ -184,19 +202,22 @@ class EnhancedCoffeeManager:
                 "feedback": []
             }
             
-            self.matches[match_id] = match
-            matches.append(match)
-            created_count += 1
+            if self.add_match(match):
+                matches.append(match)
+                created_count += 1
         
         self.save_matches()
         return matches
     
+    def get_user_matches(self, user_id: str) -> List[Dict]:
+        return [self.matches[match_id] for match_id in self.match_index.user_match_ids(user_id)]
+    
     def get_user_insights(self, user_id: str) -> Dict:
         profile = self.profiles.get(user_id)
         if not profile:
             return {}
         
-        user_matches = [m for m in self.matches.values() if user_id in m["users"]]
+        user_matches = self.get_user_matches(user_id)
         
         # Статистика
         total_matches = len(user_matches)
@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+from json_journal import JsonJournal
+
+FINISHED_STATUSES = {"completed", "failed"}
+
+class Job:
+    """One background job: a persisted record, per-user checkpoints and an in-memory event feed"""
+
+    def __init__(self, manager, record: Dict):
+        self.manager = manager
+        self.record = record
+        self.events = []  # SSE feed, readers keep a cursor into it
+        self.checkpoints = {}  # user_id -> outcome, survives restarts via the journal
+        self._journal = JsonJournal(manager.path(record["job_id"], "checkpoints.json"))
+        for entry in self._journal.load():
+            self.checkpoints[entry["user_id"]] = entry["outcome"]
+
+    @property
+    def job_id(self) -> str:
+        return self.record["job_id"]
+
+    @property
+    def upload_file(self) -> str:
+        return self.manager.path(self.job_id, "upload")
+
+    @property
+    def finished(self) -> bool:
+        return self.record["status"] in FINISHED_STATUSES
+
+    def emit(self, event_type: str, **data):
+        with self.manager.lock:
+            self.events.append({"type": event_type, "job_id": self.job_id, **data})
+
+    def update(self, **fields):
+        with self.manager.lock:
+            self.record.update(fields)
+            self.record["updated_at"] = datetime.now().isoformat()
+            self.manager.save_record(self.record)
+        self.emit("status", status=self.record["status"], phase=self.record.get("phase"))
+
+    def set_phase(self, phase: str):
+        self.update(phase=phase)
+
+    def checkpoint(self, user_id: str, outcome: Dict, done: int, total: int):
+        """Per-user outcome, journaled before the job moves on so a restart skips this user"""
+        self._journal.append(len(self.checkpoints), {"user_id": user_id, "outcome": outcome})
+        self._journal.sync()
+        with self.manager.lock:
+            self.checkpoints[user_id] = outcome
+            self.record["progress"] = {"done": done, "total": total}
+        self.emit("progress", done=done, total=total, user_id=user_id,
+                  courses_assigned=(outcome.get("assignment") or {}).get("courses_assigned", []))
+
+    def close(self):
+        self._journal.close()
+
+    def to_dict(self) -> Dict:
+        with self.manager.lock:
+            return {**self.record, "checkpointed_users": len(self.checkpoints)}
+
+class JobManager:
+    """Runs jobs on a small worker pool; unfinished jobs are resumed from their checkpoints on restart"""
+
+    def __init__(self, handler, jobs_dir: str = "data/jobs", max_workers: int = None):
+        self.handler = handler  # handler(job) -> result dict
+        self.jobs_dir = jobs_dir
+        self.jobs = {}
+        self.lock = threading.RLock()
+        os.makedirs(jobs_dir, exist_ok=True)
+        # One worker by default: protocol jobs write the shared tracker and audit log
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or int(os.getenv('JOB_WORKERS', '1')), thread_name_prefix="job")
+
+    def path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.{suffix}")
+
+    def submit(self, kind: str, upload: bytes, options: Dict = None) -> Job:
+        job_id = uuid.uuid4().hex[:12]
+        with open(self.path(job_id, "upload"), 'wb') as f:
+            f.write(upload)
+        now = datetime.now().isoformat()
+        record = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "phase": None,
+            "options": options or {},
+            "progress": {"done": 0, "total": 0},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        self.save_record(record)
+        job = Job(self, record)
+        with self.lock:
+            self.jobs[job_id] = job
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self, limit: int = 20) -> List[Dict]:
+        with self.lock:
+            jobs = sorted(self.jobs.values(), key=lambda j: j.record["created_at"], reverse=True)[:limit]
+        return [job.to_dict() for job in jobs]
+
+    def resume(self):
+        """Loads persisted jobs and re-queues the ones a crash or restart interrupted"""
+        for name in sorted(os.listdir(self.jobs_dir)):
+            if not name.endswith(".job.json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+            except Exception as e:
+                print(f"Error loading job {name}: {e}")
+                continue
+            job = Job(self, record)
+            with self.lock:
+                self.jobs[job.job_id] = job
+            if not job.finished:
+                job.emit("status", status="resumed", phase=record.get("phase"))
+                self.executor.submit(self._run, job)
+
+    def save_record(self, record: Dict):
+        """Writes the job record atomically"""
+        path = self.path(record["job_id"], "job.json")
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: Job):
+        job.update(status="running")
+        try:
+            result = self.handler(job)
+            job.update(status="completed", phase=None, result=result)
+            if os.path.exists(job.upload_file):
+                os.remove(job.upload_file)
+        except Exception as e:
+            print(f"Job {job.job_id} failed: {e}")
+            job.update(status="failed", error=str(e))
+        job.close()
+        job.emit("done", status=job.record["status"])
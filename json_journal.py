@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+class JsonJournal:
+    """Append-only JSON-lines journal on top of a JSON list snapshot.
+
+    Lines carry the entry's position in the full log (seq), so replaying after a
+    crash between snapshot and journal truncation never duplicates entries.
+    Appends are fsynced in batches, at the latest fsync_interval seconds later
+    by a timer. Compaction writes the snapshot without holding the lock.
+    """
+
+    def __init__(self, snapshot_file: str, journal_file: str = None, fsync_every: int = None,
+                 fsync_interval: float = None, compact_every: int = None):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file or os.path.splitext(snapshot_file)[0] + ".journal.jsonl"
+        self.fsync_every = fsync_every if fsync_every is not None else int(os.getenv('JOURNAL_FSYNC_EVERY', '20'))
+        self.fsync_interval = fsync_interval if fsync_interval is not None else float(os.getenv('JOURNAL_FSYNC_INTERVAL', '1.0'))
+        self.compact_every = compact_every if compact_every is not None else int(os.getenv('JOURNAL_COMPACT_EVERY', '1000'))
+        self.journal_entries = 0  # lines in the journal since the last compaction
+        self._pending_fsync = 0
+        self._last_fsync = time.monotonic()
+        self._handle = None
+        self._timer = None
+        self._compacting = False
+        self._lock = threading.RLock()
+
+    def load(self) -> List[Dict]:
+        """Snapshot plus journal tail; a torn last line from a crash is ignored"""
+        entries = []
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+
+        self.journal_entries = 0
+        if os.path.exists(self.journal_file):
+            valid_bytes = 0
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line.decode('utf-8'))
+                    except (UnicodeDecodeError, json.JSONDecodeError):
+                        break
+                    valid_bytes += len(line)
+                    self.journal_entries += 1
+                    if record["seq"] == len(entries):
+                        entries.append(record["entry"])
+            # Cut the torn tail so new lines are not appended after garbage
+            if valid_bytes < os.path.getsize(self.journal_file):
+                with open(self.journal_file, 'r+b') as f:
+                    f.truncate(valid_bytes)
+        return entries
+
+    def append(self, seq: int, entry: Dict):
+        """O(1) write: one line, flushed now, fsynced in batches"""
+        line = json.dumps({"seq": seq, "entry": entry}, ensure_ascii=False) + "\n"
+        with self._lock:
+            handle = self._open()
+            handle.write(line)
+            handle.flush()
+            self.journal_entries += 1
+            self._pending_fsync += 1
+            if self._pending_fsync >= self.fsync_every or time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self.sync()
+            elif self._timer is None:
+                # Entries not followed by another append are still fsynced within the interval
+                self._timer = threading.Timer(self.fsync_interval, self._timed_sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def sync(self):
+        with self._lock:
+            if self._handle and self._pending_fsync:
+                self._handle.flush()
+                os.fsync(self._handle.fileno())
+            self._pending_fsync = 0
+            self._last_fsync = time.monotonic()
+            self._cancel_timer()
+
+    def needs_compaction(self) -> bool:
+        return self.journal_entries >= self.compact_every and not self._compacting
+
+    def compact(self, entries: List[Dict]):
+        """Writes a fresh snapshot of all entries, then drops the journal lines it covers.
+
+        Appends continue while the snapshot is written; their lines are kept.
+        A crash at any point leaves snapshot + journal replaying every entry once.
+        """
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+            self.sync()
+            entries = list(entries)
+        try:
+            tmp_file = f"{self.snapshot_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.snapshot_file)
+
+            with self._lock:
+                self.close()
+                self.journal_entries = self._rewrite_journal(len(entries))
+        finally:
+            self._compacting = False
+
+    def close(self):
+        with self._lock:
+            if self._handle:
+                self.sync()
+                self._handle.close()
+                self._handle = None
+            self._cancel_timer()
+
+    def _rewrite_journal(self, snapshot_size: int) -> int:
+        """Keeps only lines past the snapshot; returns how many remain"""
+        kept = []
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        if json.loads(line)["seq"] >= snapshot_size:
+                            kept.append(line)
+                    except (json.JSONDecodeError, KeyError):
+                        break
+        tmp_file = f"{self.journal_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.writelines(kept)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.journal_file)
+        return len(kept)
+
+    def _timed_sync(self):
+        with self._lock:
+            self._timer = None
+            self.sync()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _open(self):
+        if self._handle is None:
+            self._handle = open(self.journal_file, 'a', encoding='utf-8')
+        return self._handle
@@ -7,6 +7,9 @@ class LocalDatabase:
         self.users = []
         self.courses = []
         self.user_courses = []
+        self._users_by_id = {}  # user_id -> user
+        self._courses_by_user = {}  # user_id -> [course_id]
+        self._user_course_index = {}  # (user_id, course_id) -> user_course
         self.load_data()
     
     def load_data(self):
@@ -24,49 +27,69 @@ class LocalDatabase:
         with open('data/user_courses.csv', 'r') as f:
             reader = csv.DictReader(f)
             self.user_courses = list(reader)
+        
+        self._build_indexes()
+    
+    def _build_indexes(self):
+        """Строим хэш-индексы по user_id и (user_id, course_id)"""
+        self._users_by_id = {user['user_id']: user for user in self.users}
+        self._courses_by_user = {}
+        self._user_course_index = {}
+        for uc in self.user_courses:
+            self._index_user_course(uc)
+    
+    def _index_user_course(self, uc: Dict):
+        key = (uc['user_id'], uc['course_id'])
+        if key not in self._user_course_index:
+            self._user_course_index[key] = uc
+            self._courses_by_user.setdefault(uc['user_id'], []).append(uc['course_id'])
     
     def get_user(self, user_id: str) -> Optional[Dict]:
-        for user in self.users:
-            if user['user_id'] == user_id:
-                return user
-        return None
+        return self._users_by_id.get(user_id)
+    
+    def get_users(self, user_ids: List[str]) -> Dict[str, Dict]:
+        """Batch lookup: user_id -> user, unknown ids are skipped"""
+        return {uid: self._users_by_id[uid] for uid in user_ids if uid in self._users_by_id}
     
     def get_user_courses(self, user_id: str) -> List[str]:
-        return [uc['course_id'] for uc in self.user_courses if uc['user_id'] == user_id]
+        return list(self._courses_by_user.get(user_id, []))
     
     def get_all_courses(self) -> List[Dict]:
         return self.courses
     
     def assign_course(self, user_id: str, course_id: str):
         # Проверяем, не назначен ли уже курс
-        for uc in self.user_courses:
-            if uc['user_id'] == user_id and uc['course_id'] == course_id:
-                return  # Уже назначен
+        if (user_id, course_id) in self._user_course_index:
+            return  # Уже назначен
         
         # Добавляем новое назначение
-        self.user_courses.append({
+        uc = {
             'user_id': user_id,
             'course_id': course_id,
             'completed_on': ''
-        })
+        }
+        self.user_courses.append(uc)
+        self._index_user_course(uc)
     
     def get_assignment_history(self, user_id: str, course_id: str) -> Optional[Dict]:
-        for uc in self.user_courses:
-            if uc['user_id'] == user_id and uc['course_id'] == course_id:
-                return uc
-        return None
+        return self._user_course_index.get((user_id, course_id))
     
     def get_all_users(self) -> List[Dict]:
         return self.users
     
     def update_user(self, user_id: str, updates: dict) -> bool:
         """Обновить данные user"""
-        for user in self.users:
-            if user['user_id'] == user_id:
-                user.update(updates)
-                self.save_users()
-                return True
-        return False
+        user = self._users_by_id.get(user_id)
+        if not user:
+            return False
+        
+        user.update(updates)
+        # user_id может поменяться через updates - держим индекс в актуальном состоянии
+        if user['user_id'] != user_id:
+            del self._users_by_id[user_id]
+            self._users_by_id[user['user_id']] = user
+        self.save_users()
+        return True
     
     def save_users(self):
         """Сохраняем обновленных пользователей в CSV"""
@@ -2,16 +2,19 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
 from ai_mentor import AIMentor
-from pdf_processor import extract_text_from_pdf
+from pdf_processor import extract_pdf, shutdown_pool
 from document_tracker import DocumentTracker
+from doc_retrieval import DocumentRetriever
 from course_scheduler import CourseScheduler
 from audit_logger import AuditLogger
 from user_dashboard import generate_user_dashboard_html
 from course_completion import CourseCompletion
+from compliance_tracker import ComplianceTracker
 from random_coffee import RandomCoffeeManager
 from bedrock_client import BedrockClient
 from coffee_messenger import CoffeeMessenger
@@ -19,7 +22,10 @@ from online_store import OnlineStore
 from merch_system import MerchSystem
 from enhanced_coffee import EnhancedCoffeeManager
 from badge_system import BadgeSystem
+from job_queue import JobManager
+import asyncio
 import json
+import threading
 
 app = FastAPI(title="EHS AI Mentor", version="1.0.0")
 
@@ -102,6 +108,7 @@ async def get_deep_breath_sticker():
 
 mentor = AIMentor()
 doc_tracker = DocumentTracker()
+retriever = DocumentRetriever(doc_tracker)
 scheduler = CourseScheduler()
 audit_logger = AuditLogger()
 course_completion = CourseCompletion()
@@ -112,6 +119,17 @@ store = OnlineStore()
 merch_system = MerchSystem()
 enhanced_coffee = EnhancedCoffeeManager()
 badge_system = BadgeSystem()
+compliance = ComplianceTracker(scheduler)
+compliance.rebuild(audit_logger.get_logs(action="course_assigned"), course_completion.completions)
+protocol_lock = threading.Lock()  # one protocol at a time writes the tracker and audit log
+
+@app.on_event("shutdown")
+async def flush_journals():
+    """Fsync append-only journals and stop PDF workers before the process exits"""
+    jobs.shutdown()
+    shutdown_pool()
+    audit_logger.close()
+    course_completion.close()
 
 @app.get("/store/products")
 async def get_store_products():
@@ -179,20 +197,38 @@ async def add_store_product(
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def stream_sse(tokens, on_complete=None):
+    """Wraps a token iterator into server-sent events; on_complete gets the full text at the end"""
+    parts = []
+    try:
+        for token in tokens:
+            parts.append(token)
+            yield sse_event({"type": "token", "text": token})
+    except Exception as e:
+        yield sse_event({"type": "error", "error": str(e)})
+    
+    full_text = "".join(parts)
+    if on_complete and full_text:
+        on_complete(full_text)
+    yield sse_event({"type": "done", "response": full_text})
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/chat")
-async def chat_with_ai(message: str = Form(...), history: str = Form(default="[]")):
+async def chat_with_ai(message: str = Form(...), history: str = Form(default="[]"), stream: bool = Form(default=False)):
     """AI chat for safety consultations"""
     try:
-        # Get context from processed documents
-        context = ""
-        for doc_hash, doc_info in doc_tracker.processed_docs.items():
-            context += f"Document: {doc_info['title']}\n"
-            if 'content' in doc_info:
-                context += doc_info['content'][:500] + "...\n\n"
+        # Only the processed-document chunks relevant to the question, within a token budget
+        retrieved = await run_in_threadpool(retriever.build_context, message)
+        context = retrieved["text"] or "No processed documents match this question."
         
         # Create AI prompt
         system_prompt = f"""You are a safety and occupational health expert. 
-        Answer questions based on the following processed documents:
+        Answer questions based on the following excerpts from processed documents:
         
         {context}
         
@@ -202,54 +238,62 @@ async def chat_with_ai(message: str = Form(...), history: str = Form(default="[]
         chat_history = json.loads(history)
         chat_history.append({"role": "user", "content": message})
         
-        # Call Bedrock
-        response = mentor.bedrock.client.invoke_model(
-            modelId="us.anthropic.claude-3-5-haiku-20241022-v1:0",
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 500,
-                "system": system_prompt,
-                "messages": chat_history
-            })
-        )
+        if stream:
+            return sse_response(stream_sse(mentor.bedrock.stream_chat_messages(chat_history, system_prompt)))
         
-        response_body = json.loads(response['body'].read())
-        ai_response = response_body['content'][0]['text']
+        # Call Bedrock without blocking the event loop
+        ai_response = await mentor.bedrock.achat_messages(chat_history, system_prompt)
         
-        return {"response": ai_response, "success": True}
+        return {"response": ai_response, "success": True, "sources": retrieved["sources"]}
         
     except Exception as e:
         return {"response": f"AI Error: {str(e)}", "success": False}
 
-@app.post("/upload-pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    try:
-        if not file.filename.endswith('.pdf'):
-            raise HTTPException(status_code=400, detail="Only PDF files allowed")
-        
-        pdf_bytes = await file.read()
-        protocol_text = extract_text_from_pdf(pdf_bytes)
-        
+def process_protocol(extraction: dict, use_cache: bool = True, completed_users: dict = None, on_user_done=None, on_phase=None) -> dict:
+    """Duplicate check, AI analysis and tracker/audit writes for one extracted protocol"""
+    protocol_text = extraction["text"]
+    
+    with protocol_lock:
         # Check if document was processed before
-        is_duplicate, prev_info = doc_tracker.is_duplicate(protocol_text)
+        duplicate_hash = doc_tracker.find_duplicate(protocol_text)
         
-        if is_duplicate:
+        if duplicate_hash:
             return {
                 "is_duplicate": True,
                 "message": "This document has already been processed",
-                "previous_processing": prev_info,
+                "previous_processing": doc_tracker.get_document_summary(duplicate_hash),
+                "extracted_text": protocol_text[:500] + "..." if len(protocol_text) > 500 else protocol_text
+            }
+        
+        # Re-exported or revised copy of a processed document: only changed sections are analyzed
+        revision = doc_tracker.find_revision(protocol_text)
+        diff = revision["diff"] if revision else None
+        if diff and not diff["changed"] and not diff["added"]:
+            return {
+                "is_duplicate": True,
+                "near_duplicate": True,
+                "message": "This document matches an already processed one section by section",
+                "previous_processing": doc_tracker.get_document_summary(revision["document_hash"]),
+                "similarity": revision["similarity"],
                 "extracted_text": protocol_text[:500] + "..." if len(protocol_text) > 500 else protocol_text
             }
         
         # Process new document with history and deadline checking
         mentor._scheduler = scheduler  # Pass scheduler
-        result = mentor.analyze_for_all_users_with_history(protocol_text, doc_tracker)
+        if diff:
+            known_requirements = doc_tracker.processed_docs.get(revision["document_hash"], {}).get("requirements", {})
+            result = mentor.analyze_revision(diff["changed_text"], known_requirements, doc_tracker, use_cache=use_cache,
+                                             completed_users=completed_users, on_user_done=on_user_done, on_phase=on_phase)
+        else:
+            result = mentor.analyze_for_all_users_with_history(protocol_text, doc_tracker, use_cache=use_cache,
+                                                               completed_users=completed_users, on_user_done=on_user_done, on_phase=on_phase)
+        if on_phase:
+            on_phase("saving")
         
-        # Save processing information with skipped and content for chat
-        doc_hash = doc_tracker.save_document(protocol_text, result.get("assignments", []), result.get("skipped_duplicates", []))
-        # Save content for AI chat
-        if doc_hash in doc_tracker.processed_docs:
-            doc_tracker.processed_docs[doc_hash]['content'] = protocol_text
+        # Save processing information with skipped; the text itself is stored for chat
+        doc_hash = doc_tracker.save_document(protocol_text, result.get("assignments", []), result.get("skipped_duplicates", []),
+                                             revision_of=revision["document_hash"] if revision else None,
+                                             requirements=result.get("requirements"))
         
         # Log document processing
         audit_logger.log_document_processed(
@@ -270,7 +314,7 @@ async def upload_pdf(file: UploadFile = File(...)):
                             break
                 
                 # Add document hash to log
-                log_entry = {
+                log_entry = audit_logger.append_log({
                     "timestamp": audit_logger.logs[-1]["timestamp"] if audit_logger.logs else "2025-01-01T00:00:00",
                     "action": "course_assigned",
                     "user_id": assignment["user_id"],
@@ -280,24 +324,107 @@ async def upload_pdf(file: UploadFile = File(...)):
                     "priority": priority,
                     "document_hash": doc_hash,
                     "id": len(audit_logger.logs) + 1
-                }
-                audit_logger.logs.append(log_entry)
+                })
+                compliance.record_assignment(assignment["user_id"], clean_course_id, log_entry["timestamp"], priority)
         
-        # Save logs
+        # Flush journal once for the whole batch
         audit_logger.save_logs()
         
         result["extracted_text"] = protocol_text[:500] + "..." if len(protocol_text) > 500 else protocol_text
         result["is_duplicate"] = False
         result["document_hash"] = doc_hash
+        if revision:
+            result["revision_of"] = {**revision, "diff": {k: v for k, v in diff.items() if k != "changed_text"} if diff else None}
+        result["pdf_pages"] = {k: extraction[k] for k in ("pages", "total_pages", "truncated", "seconds")}
         
         # Add information about expiring courses
-        expired_courses = scheduler.get_expired_courses(doc_tracker)
+        expired_courses = compliance.get_expired_by_user()
         result["expired_courses"] = expired_courses
         
         return result
+
+@app.post("/upload-pdf")
+async def upload_pdf(file: UploadFile = File(...), refresh_cache: bool = Form(default=False)):
+    try:
+        if not file.filename.endswith('.pdf'):
+            raise HTTPException(status_code=400, detail="Only PDF files allowed")
+        
+        pdf_bytes = await file.read()
+        # Pages are extracted in a process pool, the event loop only waits
+        extraction = await run_in_threadpool(extract_pdf, pdf_bytes)
+        return await run_in_threadpool(process_protocol, extraction, not refresh_cache)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def run_upload_job(job) -> dict:
+    """Background /jobs/upload-pdf handler; users already checkpointed are not analyzed again"""
+    job.set_phase("extracting")
+    with open(job.upload_file, 'rb') as f:
+        extraction = extract_pdf(f.read())
+    return process_protocol(
+        extraction,
+        use_cache=not job.record["options"].get("refresh_cache", False),
+        completed_users=job.checkpoints,
+        on_user_done=job.checkpoint,
+        on_phase=job.set_phase
+    )
+
+jobs = JobManager(run_upload_job)
+
+@app.on_event("startup")
+async def resume_jobs():
+    """Re-queue upload jobs interrupted by a restart"""
+    jobs.resume()
+
+@app.on_event("startup")
+async def warm_retriever():
+    """Index stored protocols in the background so the first chat does not pay for it"""
+    threading.Thread(target=retriever.sync, daemon=True, name="retriever-warmup").start()
+
+@app.post("/jobs/upload-pdf")
+async def create_upload_job(file: UploadFile = File(...), refresh_cache: bool = Form(default=False)):
+    """Queue protocol processing and return the job id right away"""
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files allowed")
+    
+    pdf_bytes = await file.read()
+    job = await run_in_threadpool(jobs.submit, "upload-pdf", pdf_bytes, {"filename": file.filename, "refresh_cache": refresh_cache})
+    return {"job_id": job.job_id, "status": job.record["status"]}
+
+@app.get("/jobs")
+async def list_jobs():
+    """Recent background jobs"""
+    return {"jobs": jobs.list_jobs()}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Live job status and progress"""
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str, cursor: int = 0):
+    """Job progress as server-sent events; reconnect with ?cursor=<events seen>"""
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        position = cursor
+        while True:
+            finished = job.finished
+            new_events = job.events[position:]
+            for event in new_events:
+                yield sse_event(event)
+            position += len(new_events)
+            if finished and position >= len(job.events):
+                break
+            await asyncio.sleep(0.25)
+    
+    return sse_response(events())
+
 @app.get("/admin")
 async def admin_dashboard():
     html = '''
@@ -1264,13 +1391,16 @@ async def admin_dashboard():
                 const formData = new FormData();
                 formData.append('file', fileInput.files[0]);
                 
-                const response = await fetch('/upload-pdf', {
+                const response = await fetch('/jobs/upload-pdf', {
                     method: 'POST',
                     body: formData
                 });
+                if (!response.ok) {
+                    throw new Error('Upload failed: ' + response.status);
+                }
 
-                const data = await response.json();
-                displayResult(data);
+                const { job_id } = await response.json();
+                followUploadJob(job_id);
 
             } catch (error) {
                 console.error('Error:', error);
@@ -1278,6 +1408,46 @@ async def admin_dashboard():
             }
         }
         
+        function followUploadJob(jobId) {
+            // Progress comes over SSE; the final result is read from the job record
+            const phases = {
+                'extracting': '📄 Extracting text from PDF...',
+                'summarizing': '📝 Summarizing protocol...',
+                'analyzing': '🤖 AI analyzing protocol via Amazon Bedrock...',
+                'applying': '🎯 Assigning courses...',
+                'saving': '💾 Saving results...'
+            };
+            let phaseText = '⏳ Waiting in queue...';
+            let progressText = '';
+            const render = () => showModal('🤖 AI Analysis', `<div style="text-align: center; padding: 40px;">${phaseText}<br><br>${progressText}</div>`);
+            render();
+            
+            const source = new EventSource(`/jobs/${jobId}/stream`);
+            source.onmessage = async (message) => {
+                const event = JSON.parse(message.data);
+                if (event.type === 'status' && event.phase) {
+                    phaseText = phases[event.phase] || `⏳ ${event.phase}...`;
+                    render();
+                } else if (event.type === 'progress') {
+                    progressText = `👥 ${event.done} / ${event.total} users analyzed`;
+                    render();
+                } else if (event.type === 'done') {
+                    source.close();
+                    try {
+                        const job = await (await fetch(`/jobs/${jobId}`)).json();
+                        if (job.status === 'completed') {
+                            displayResult(job.result);
+                        } else {
+                            showModal('❌ Error', `<div style="text-align: center; padding: 40px; color: #dc3545;">❌ ${job.error || 'Processing error'}</div>`);
+                        }
+                    } catch (error) {
+                        console.error('Error:', error);
+                        showModal('❌ Error', '<div style="text-align: center; padding: 40px; color: #dc3545;">❌ Processing error</div>');
+                    }
+                }
+            };
+        }
+        
         async function loadDocumentHistory() {
             try {
                 const response = await fetch('/document-history');
@@ -4054,9 +4224,9 @@ async def get_users_detail():
     
     # Добавляем информацию о назначенных courseх
     for user in users:
-        user_assignments = [log for log in audit_logger.logs if log.get("user_id") == user["user_id"] and log.get("action") == "course_assigned"]
-        user["assignments_count"] = len(user_assignments)
-        user["latest_assignment"] = user_assignments[0]["timestamp"] if user_assignments else None
+        user_stats = audit_logger.get_user_stats(user["user_id"])
+        user["assignments_count"] = user_stats["assignments_count"]
+        user["latest_assignment"] = user_stats["latest_assignment"]
     
     return {"users": users}
 
@@ -4067,24 +4237,15 @@ async def get_courses_detail():
     
     # Добавляем статистику assignments
     for course in courses:
-        course_assignments = [log for log in audit_logger.logs if log.get("course_id") == course["course_id"] and log.get("action") == "course_assigned"]
-        course["assignments_count"] = len(course_assignments)
-        course["latest_assignment"] = course_assignments[0]["timestamp"] if course_assignments else None
+        course_stats = audit_logger.get_course_stats(course["course_id"])
+        course["assignments_count"] = course_stats["assignments_count"]
+        course["latest_assignment"] = course_stats["latest_assignment"]
         
         # Добавляем AI-определенную периодичность
         course["renewal_months"] = scheduler.course_periods.get(course["course_id"], "N/A")
         
         # Приоритет берется из AI-назначений (самый высокий)
-        course_priority = "normal"  # по умолчанию
-        for log in audit_logger.logs:
-            if (log.get("course_id") == course["course_id"] and 
-                log.get("action") == "course_assigned" and 
-                log.get("priority")):
-                # Берем самый высокий приоритет
-                priorities = {"low": 1, "normal": 2, "high": 3, "critical": 4}
-                if priorities.get(log["priority"], 2) > priorities.get(course_priority, 2):
-                    course_priority = log["priority"]
-        course["priority"] = course_priority
+        course["priority"] = course_stats["priority"]
     
     return {"courses": courses}
 
@@ -4124,7 +4285,7 @@ async def complete_course(user_id: str = Form(...), course_id: str = Form(...)):
         completion = course_completion.complete_course(user_id, course_id, "manual")
         
         # Логируем завершение
-        audit_logger.logs.append({
+        audit_logger.append_log({
             "timestamp": completion["completed_at"],
             "action": "course_completed",
             "user_id": user_id,
@@ -4132,11 +4293,10 @@ async def complete_course(user_id: str = Form(...), course_id: str = Form(...)):
             "completion_method": "manual",
             "id": len(audit_logger.logs) + 1
         })
-        audit_logger.save_logs()
+        compliance.record_completion(user_id, course_id)
         
         # Получаем все завершенные курсы user
-        completed_courses = [log.get("course_id") for log in audit_logger.logs 
-                           if log.get("user_id") == user_id and log.get("action") == "course_completed"]
+        completed_courses = audit_logger.get_completed_courses(user_id)
         
         # Проверяем и присваиваем новые бейджи
         coffee_stats = enhanced_coffee.get_user_insights(user_id) if user_id in enhanced_coffee.profiles else {}
@@ -4301,16 +4461,17 @@ async def get_user_dashboard(user_id: str):
         return HTMLResponse(content="<h1>User not found</h1>")
     
     # Получаем все assignment user
-    assignments = [log for log in audit_logger.logs if log.get("user_id") == user_id and log.get("action") == "course_assigned"]
+    assignments = audit_logger.get_logs(action="course_assigned", user_id=user_id)
     
     # Добавляем информацию о courseх
     for assignment in assignments:
         course_id = assignment.get("course_id")
         if course_id:
-            assignment["is_expired"] = scheduler.is_course_expired(course_id, assignment["timestamp"])
+            state = compliance.get_state(user_id, course_id)
+            assignment["is_expired"] = state["expired"]
             assignment["renewal_months"] = scheduler.course_periods.get(course_id, "N/A")
             assignment["deadline_days"] = getattr(scheduler, 'course_deadlines', {}).get(course_id, 30)
-            assignment["is_completed"] = course_completion.is_course_completed(user_id, course_id)
+            assignment["is_completed"] = state["completed"]
     
     # Сортируем по дате
     assignments.sort(key=lambda x: x["timestamp"], reverse=True)
@@ -4328,17 +4489,18 @@ async def get_user_profile(user_id: str):
         return {"error": "User not found"}
     
     # Получаем все assignment user
-    assignments = [log for log in audit_logger.logs if log.get("user_id") == user_id and log.get("action") == "course_assigned"]
+    assignments = audit_logger.get_logs(action="course_assigned", user_id=user_id)
     
     # Добавляем информацию о courseх
     for assignment in assignments:
         course_id = assignment.get("course_id")
         if course_id:
             # Проверяем срок действия
-            assignment["is_expired"] = scheduler.is_course_expired(course_id, assignment["timestamp"])
+            state = compliance.get_state(user_id, course_id)
+            assignment["is_expired"] = state["expired"]
             assignment["renewal_months"] = scheduler.course_periods.get(course_id, "N/A")
             assignment["deadline_days"] = getattr(scheduler, 'course_deadlines', {}).get(course_id, "N/A")
-            assignment["is_completed"] = course_completion.is_course_completed(user_id, course_id)
+            assignment["is_completed"] = state["completed"]
     
     # Сортируем по дате
     assignments.sort(key=lambda x: x["timestamp"], reverse=True)
@@ -4354,24 +4516,29 @@ async def get_user_profile(user_id: str):
         "active_courses": len([a for a in assignments if not a.get("is_expired", False) and not a.get("is_completed", False)])
     }
 
+def attach_user_info(records: list):
+    """Adds user_name/user_role/user_department to records with one batch user lookup"""
+    users = mentor.db.get_users(list({r["user_id"] for r in records if r.get("user_id")}))
+    for record in records:
+        user = users.get(record.get("user_id"))
+        if user:
+            record["user_name"] = user["name"]
+            record["user_role"] = user["role"]
+            record["user_department"] = user["department"]
+
 @app.get("/assignments-detail")
 async def get_assignments_detail():
     """Get detailed information о assignmentх"""
-    assignments = [log for log in audit_logger.logs if log.get("action") == "course_assigned"]
-    
-    # Добавляем информацию о userх
-    for assignment in assignments:
-        if assignment.get("user_id"):
-            user = mentor.db.get_user(assignment["user_id"])
-            if user:
-                assignment["user_name"] = user["name"]
-                assignment["user_role"] = user["role"]
-                assignment["user_department"] = user["department"]
+    assignments = audit_logger.get_logs(action="course_assigned")
     
     # Сортируем по дате
     assignments.sort(key=lambda x: x["timestamp"], reverse=True)
+    assignments = assignments[:50]  # Последние 50
     
-    return {"assignments": assignments[:50]}  # Последние 50
+    # Добавляем информацию о userх
+    attach_user_info(assignments)
+    
+    return {"assignments": assignments}
 
 @app.get("/stats")
 async def get_stats():
@@ -4385,8 +4552,7 @@ async def get_stats():
     course_count = len(courses)
     
     # Количество assignments (из audit log)
-    assignment_logs = [log for log in audit_logger.logs if log.get("action") == "course_assigned"]
-    assignment_count = len(assignment_logs)
+    assignment_count = audit_logger.count_logs("course_assigned")
     
     # Количество обработанных документов
     document_count = len(doc_tracker.processed_docs)
@@ -4394,26 +4560,10 @@ async def get_stats():
     # Количество завершенных курсов
     completion_stats = course_completion.get_completion_stats()
     
-    # Подсчитываем дополнительную статистику
-    expired_count = 0
-    critical_count = 0
-    active_count = 0
-    
-    for log in assignment_logs:
-        user_id = log.get("user_id")
-        course_id = log.get("course_id")
-        if user_id and course_id:
-            is_expired = scheduler.is_course_expired(course_id, log["timestamp"])
-            is_completed = course_completion.is_course_completed(user_id, course_id)
-            priority = log.get("priority", "normal")
-            
-            if is_expired and not is_completed:
-                expired_count += 1
-            elif not is_expired and not is_completed:
-                active_count += 1
-            
-            if priority == "critical" and not is_completed:
-                critical_count += 1
+    # Статусы по (user, course) из таблицы compliance
+    compliance_counts = compliance.get_counts()
+    expired_count = compliance_counts["expired"]
+    active_count = compliance_counts["active"]
     
     return {
         "users": user_count,
@@ -4431,25 +4581,22 @@ async def get_document_history():
     """Get историю обработанных документов"""
     documents = []
     
+    # Старые assignment без хэша группируем по минуте один раз
+    legacy_by_minute = {}
+    for log in audit_logger.get_logs(action="course_assigned"):
+        if not log.get("document_hash"):
+            legacy_by_minute.setdefault(log.get("timestamp", "")[:16], []).append(log)
+    
     # Проходим по всем обработанным documentм
     for doc_hash, doc_info in doc_tracker.processed_docs.items():
         # Находим все assignment, сделанные в то же время
         doc_minute = doc_info["processed_at"][:16]  # 2025-09-18T13:29
         
-        doc_assignments = []
-        for log in audit_logger.logs:
-            if log.get("action") == "course_assigned":
-                # Новые документы - по хэшу, старые - по времени
-                if (log.get("document_hash") == doc_hash or 
-                    (not log.get("document_hash") and log.get("timestamp", "")[:16] == doc_minute)):
-                    
-                    user = mentor.db.get_user(log["user_id"])
-                    if user:
-                        log["user_name"] = user["name"]
-                        log["user_role"] = user["role"]
-                        log["user_department"] = user["department"]
-                    
-                    doc_assignments.append(log)
+        # Новые документы - по хэшу, старые - по времени
+        doc_assignments = (audit_logger.get_logs(action="course_assigned", document_hash=doc_hash)
+                           + legacy_by_minute.get(doc_minute, []))
+        
+        attach_user_info(doc_assignments)
         
         # Получаем сохраненные skipped_duplicates
         skipped_info = doc_info.get("skipped_duplicates", [])
@@ -4477,13 +4624,7 @@ async def get_audit_log():
     recent_logs = audit_logger.get_recent_logs(100)
     
     # Добавляем информацию о userх
-    for log in recent_logs:
-        if log.get("user_id"):
-            user = mentor.db.get_user(log["user_id"])
-            if user:
-                log["user_name"] = user["name"]
-                log["user_role"] = user["role"]
-                log["user_department"] = user["department"]
+    attach_user_info(recent_logs)
     
     return {
         "total_logs": len(recent_logs),
@@ -4495,28 +4636,40 @@ async def get_completions_detail():
     """Get detailed information о завершенных courseх"""
     completions = course_completion.completions.copy()
     
-    # Добавляем информацию о userх
-    for completion in completions:
-        if completion.get("user_id"):
-            user = mentor.db.get_user(completion["user_id"])
-            if user:
-                completion["user_name"] = user["name"]
-                completion["user_role"] = user["role"]
-                completion["user_department"] = user["department"]
-    
     # Сортируем по дате
     completions.sort(key=lambda x: x["completed_at"], reverse=True)
+    completions = completions[:50]  # Последние 50
+    
+    # Добавляем информацию о userх
+    attach_user_info(completions)
     
-    return {"completions": completions[:50]}  # Последние 50
+    return {"completions": completions}
+
+@app.get("/bedrock/metrics")
+async def get_bedrock_metrics():
+    """Get Bedrock call counters and latency percentiles"""
+    return {"bedrock": mentor.bedrock.get_metrics(), "decision_cache": mentor.bedrock.decision_cache.get_stats()}
+
+@app.get("/decision-cache/stats")
+async def get_decision_cache_stats():
+    """Get AI decision cache statistics"""
+    return mentor.bedrock.decision_cache.get_stats()
+
+@app.post("/decision-cache/clear")
+async def clear_decision_cache():
+    """Clear AI decision cache"""
+    mentor.bedrock.decision_cache.clear()
+    return {"success": True}
 
 @app.get("/expired-courses")
 async def get_expired_courses():
     """Get список users с истекающими courseми"""
-    expired_list = scheduler.get_expired_courses(doc_tracker)
+    expired_list = compliance.get_expired_by_user()
     
     # Получаем информацию о userх
+    users = mentor.db.get_users([item["user_id"] for item in expired_list])
     for item in expired_list:
-        user = mentor.db.get_user(item["user_id"])
+        user = users.get(item["user_id"])
         if user:
             item["user_name"] = user["name"]
             item["role"] = user["role"]
@@ -4582,7 +4735,7 @@ async def get_user_matches(user_id: str):
     """Get user matches from both systems"""
     # Получаем матчи из обеих систем
     basic_matches = coffee_manager.get_user_matches(user_id)
-    enhanced_matches = [m for m in enhanced_coffee.matches.values() if user_id in m.get("users", [])]
+    enhanced_matches = enhanced_coffee.get_user_matches(user_id)
     
     # Объединяем и обогащаем данными
     all_matches = basic_matches + enhanced_matches
@@ -4640,7 +4793,8 @@ async def get_coffee_stats():
 async def create_weekly_matches():
     """Create weekly matches (админская функция)"""
     try:
-        matches = coffee_manager.create_weekly_matches()
+        # Matching is CPU-bound: keep it off the event loop
+        matches = await run_in_threadpool(coffee_manager.create_weekly_matches)
         
         # Send welcome messages
         for match in matches:
@@ -4811,26 +4965,8 @@ async def admin_coffee_chats():
 async def cleanup_duplicate_matches():
     """Очистка дублирующихся матчей"""
     try:
-        # Перезагружаем матчи из файла
-        enhanced_coffee.matches = enhanced_coffee.load_matches()
-        
-        # Находим дубликаты
-        seen_pairs = set()
-        duplicates = []
-        
-        for match_id, match in enhanced_coffee.matches.items():
-            users = tuple(sorted(match["users"]))
-            if users in seen_pairs:
-                duplicates.append(match_id)
-            else:
-                seen_pairs.add(users)
-        
-        # Удаляем дубликаты
-        for dup_id in duplicates:
-            del enhanced_coffee.matches[dup_id]
-        
-        # Сохраняем
-        enhanced_coffee.save_matches()
+        # Новые дубликаты не создаются; убираем оставшиеся в файле от старых версий
+        duplicates = enhanced_coffee.remove_duplicate_matches()
         
         return {"success": True, "removed_duplicates": len(duplicates), "duplicate_ids": duplicates}
     except Exception as e:
@@ -4864,15 +5000,12 @@ async def create_test_message(user_id: str = Form(...)):
         enhanced_coffee.messages[test_match_id].append(test_message)
         
         # Также добавляем тестовый матч в enhanced_coffee.matches
-        if not hasattr(enhanced_coffee, 'matches'):
-            enhanced_coffee.matches = {}
-            
-        enhanced_coffee.matches[test_match_id] = {
+        enhanced_coffee.add_match({
             "id": test_match_id,
             "users": [user_id, "u999"],
             "status": "confirmed",
             "created_at": datetime.now().isoformat()
-        }
+        })
         
         return {"success": True, "message": "Test message created", "match_id": test_match_id}
     except Exception as e:
@@ -4896,7 +5029,7 @@ async def get_unread_messages(user_id: str):
         
         # Проверяем новую enhanced систему
         try:
-            enhanced_matches = [m for m in enhanced_coffee.matches.values() if user_id in m.get("users", [])]
+            enhanced_matches = enhanced_coffee.get_user_matches(user_id)
             for match in enhanced_matches:
                 match_id = match.get("id")
                 if match_id and match_id in enhanced_coffee.messages:
@@ -5024,8 +5157,15 @@ def save_chat_message(user_id: str, user_msg: str, ai_response: str):
     except Exception as e:
         print(f"Error saving chat: {e}")
 
+def coffee_ai_stream(user_id: str, message: str) -> StreamingResponse:
+    """Streams mentor.chat tokens, persisting the full reply like the non-streaming path"""
+    return sse_response(stream_sse(
+        mentor.stream_chat(message, user_id),
+        on_complete=lambda text: save_chat_message(user_id, message, text)
+    ))
+
 @app.post("/coffee/chat")
-async def coffee_chat(user_id: str = Form(...), message: str = Form(...)):
+async def coffee_chat(user_id: str = Form(...), message: str = Form(...), stream: bool = Form(default=False)):
     """Friendly AI chat for Random Coffee"""
     try:
         # Проверка еженедельных напоминаний перенесена ниже
@@ -5039,7 +5179,7 @@ async def coffee_chat(user_id: str = Form(...), message: str = Form(...)):
         
         # Получаем матчи из обеих систем
         matches = coffee_manager.get_user_matches(user_id)
-        enhanced_matches = [m for m in enhanced_coffee.matches.values() if user_id in m.get("users", [])]
+        enhanced_matches = enhanced_coffee.get_user_matches(user_id)
         all_matches = matches + enhanced_matches
         
         # Проверяем, нужно ли напомнить о создании новых матчей (только для пользователей с профилем)
@@ -5049,7 +5189,7 @@ async def coffee_chat(user_id: str = Form(...), message: str = Form(...)):
                 from datetime import datetime, timedelta
                 
                 # Получаем последний матч пользователя
-                user_matches = [m for m in enhanced_coffee.matches.values() if user_id in m.get("users", [])]
+                user_matches = enhanced_coffee.get_user_matches(user_id)
                 if user_matches:
                     latest_match = max(user_matches, key=lambda x: x["created_at"])
                     match_date = datetime.fromisoformat(latest_match["created_at"].replace('Z', ''))
@@ -5128,7 +5268,7 @@ async def coffee_chat(user_id: str = Form(...), message: str = Form(...)):
                         pass
                     
                     # Используем Enhanced алгоритм для лучшего матчинга
-                    new_matches = enhanced_coffee.create_ai_matches(1)
+                    new_matches = await run_in_threadpool(enhanced_coffee.create_ai_matches, 1)
                     if new_matches:
                         response_text = f"🎯 Awesome, {user_name}! I just found you {len(new_matches)} potential friends among Cal Poly students! Check your matches - I selected people with similar interests: {', '.join(user_interests)}. Each match has a compatibility score! ✨"
                         save_chat_message(user_id, message, response_text)
@@ -5144,8 +5284,10 @@ async def coffee_chat(user_id: str = Form(...), message: str = Form(...)):
             
             # 2. Вопросы о безопасности
             elif any(word in message_lower for word in ["safety", "security", "hazard", "risk", "ppe", "equipment", "accident", "incident", "emergency", "fire", "chemical", "lab", "workplace", "protocol", "training", "безопасност", "охрана труда"]):
+                if stream:
+                    return coffee_ai_stream(user_id, message)
                 try:
-                    safety_response = mentor.chat(message, user_id)
+                    safety_response = await mentor.achat(message, user_id)
                     response_text = safety_response.get('response', f'Great safety question, {user_name}! I can help with workplace safety, protocols, training, and safety concerns.')
                     save_chat_message(user_id, message, response_text)
                     return {"response": response_text, "success": True}
@@ -5172,8 +5314,10 @@ async def coffee_chat(user_id: str = Form(...), message: str = Form(...)):
             # 4. Общие вопросы и помощь
             else:
                 # Используем основной AI для общих вопросов
+                if stream:
+                    return coffee_ai_stream(user_id, message)
                 try:
-                    general_response = mentor.chat(message, user_id)
+                    general_response = await mentor.achat(message, user_id)
                     response_text = general_response.get('response', f'Hi {user_name}! I can help with safety questions, friend matching, campus life, or just chat! What would you like to know?')
                     save_chat_message(user_id, message, response_text)
                     return {"response": response_text, "success": True}
@@ -5255,11 +5399,7 @@ async def get_personalized_merch_feed(user_id: str):
         raise HTTPException(status_code=404, detail="User not found")
     
     # Получаем пройденные курсы
-    completed_courses = []
-    for log in audit_logger.logs:
-        if (log.get("user_id") == user_id and 
-            log.get("action") == "course_completed"):
-            completed_courses.append(log.get("course_id"))
+    completed_courses = audit_logger.get_completed_courses(user_id)
     
     merch_feed = merch_system.get_personalized_feed(user_data, completed_courses)
     return {"merch": merch_feed, "success": True}
@@ -5341,7 +5481,7 @@ async def create_ai_matches(max_matches: int = Form(default=20), user_id: str =
                 "matches": []
             }
         
-        matches = enhanced_coffee.create_ai_matches(max_matches, user_id)
+        matches = await run_in_threadpool(enhanced_coffee.create_ai_matches, max_matches, user_id)
         return {
             "success": True,
             "weekly_limit": False,
@@ -5368,8 +5508,7 @@ async def get_enhanced_profile(user_id: str):
 @app.delete("/enhanced-coffee/matches/{match_id}")
 async def delete_match(match_id: str):
     """Удалить матч"""
-    if match_id in enhanced_coffee.matches:
-        del enhanced_coffee.matches[match_id]
+    if enhanced_coffee.delete_match(match_id):
         enhanced_coffee.save_matches()
         return {"success": True, "message": "Match deleted"}
     return {"error": "Match not found"}
@@ -5377,7 +5516,7 @@ async def delete_match(match_id: str):
 @app.get("/enhanced-coffee/user-matches/{user_id}")
 async def get_user_matches(user_id: str):
     """Получить матчи пользователя"""
-    user_matches = [m for m in enhanced_coffee.matches.values() if user_id in m.get("users", [])]
+    user_matches = enhanced_coffee.get_user_matches(user_id)
     return {"matches": user_matches, "count": len(user_matches)}
 
 # Badge System endpoints
@@ -5394,8 +5533,7 @@ async def get_badge_progress(user_id: str):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    completed_courses = [log.get("course_id") for log in audit_logger.logs 
-                        if log.get("user_id") == user_id and log.get("action") == "course_completed"]
+    completed_courses = audit_logger.get_completed_courses(user_id)
     
     coffee_stats = enhanced_coffee.get_user_insights(user_id) if user_id in enhanced_coffee.profiles else {}
     progress = badge_system.get_badge_progress(user_id, user, completed_courses, coffee_stats)
@@ -1,16 +1,108 @@
+import multiprocessing
+import os
+import tempfile
+import time
 import PyPDF2
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
+from typing import Dict, Iterator, List
 
-def extract_text_from_pdf(pdf_bytes: bytes) -> str:
-    """Извлекает текст из PDF file"""
+PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', '500'))
+PDF_MAX_BYTES = int(os.getenv('PDF_MAX_BYTES', str(50 * 1024 * 1024)))
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', '8'))
+
+_pool = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Spawned, not forked: the server process has live threads and locks
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown_pool():
+    """Stops the PDF worker processes; the next extraction starts a new pool"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+def _read_pages(reader: PyPDF2.PdfReader, start: int, end: int) -> List[Dict]:
+    pages = []
+    for index in range(start, end):
+        started = time.perf_counter()
+        text = reader.pages[index].extract_text() or ""
+        pages.append({"page": index + 1, "text": text, "seconds": round(time.perf_counter() - started, 4)})
+    return pages
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[Dict]:
+    """Worker: parses the PDF file and extracts pages [start, end)"""
+    return _read_pages(PyPDF2.PdfReader(pdf_path), start, end)
+
+def _plan_pages(pdf_bytes: bytes, max_pages: int = None, max_bytes: int = None) -> tuple:
+    """Enforces the byte budget, returns (total_pages, pages_to_extract)"""
+    max_bytes = max_bytes or PDF_MAX_BYTES
+    if len(pdf_bytes) > max_bytes:
+        raise ValueError(f"PDF is {len(pdf_bytes)} bytes, limit is {max_bytes}")
+    total_pages = len(PyPDF2.PdfReader(BytesIO(pdf_bytes)).pages)
+    page_count = min(total_pages, max_pages or PDF_MAX_PAGES)
+    if page_count < total_pages:
+        print(f"PDF has {total_pages} pages, extracting the first {page_count}")
+    return total_pages, page_count
+
+def _iter_pages(pdf_bytes: bytes, page_count: int) -> Iterator[Dict]:
+    # Small documents are not worth the process hop
+    if page_count <= PDF_PAGES_PER_TASK or PDF_WORKERS <= 1:
+        yield from _read_pages(PyPDF2.PdfReader(BytesIO(pdf_bytes)), 0, page_count)
+        return
+
+    # Workers get a file path rather than a pickled copy of the whole PDF per task
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(pdf_bytes)
+    pool = _get_pool()
+    futures = [pool.submit(_extract_page_range, f.name, start, min(start + PDF_PAGES_PER_TASK, page_count))
+               for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        # Workers already running finish their pages before the file goes away
+        for future in futures:
+            if not future.cancelled():
+                future.exception()
+        os.unlink(f.name)
+
+def iter_pdf_pages(pdf_bytes: bytes, max_pages: int = None, max_bytes: int = None, stats: Dict = None) -> Iterator[Dict]:
+    """Yields {"page", "text", "seconds"} in page order while later pages are still being extracted
+
+    If stats is given, "total_pages" of the document is stored in it before the first page.
+    """
+    total_pages, page_count = _plan_pages(pdf_bytes, max_pages, max_bytes)
+    if stats is not None:
+        stats["total_pages"] = total_pages
+    yield from _iter_pages(pdf_bytes, page_count)
+
+def extract_pdf(pdf_bytes: bytes, max_pages: int = None, max_bytes: int = None) -> Dict:
+    """Text plus page statistics of a PDF"""
     try:
-        pdf_file = BytesIO(pdf_bytes)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        
-        return text.strip()
+        started = time.perf_counter()
+        stats = {}
+        pages = list(iter_pdf_pages(pdf_bytes, max_pages, max_bytes, stats))
+        total_pages = stats["total_pages"]
+        return {
+            "text": "\n".join(p["text"] for p in pages).strip(),
+            "pages": len(pages),
+            "total_pages": total_pages,
+            "truncated": len(pages) < total_pages,
+            "slowest_page": max(pages, key=lambda p: p["seconds"])["page"] if pages else None,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
     except Exception as e:
-        raise Exception(f"Error при обработке PDF: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Error при обработке PDF: {str(e)}")
+
+def extract_text_from_pdf(pdf_bytes: bytes) -> str:
+    """Извлекает текст из PDF file"""
+    return extract_pdf(pdf_bytes)["text"]
@@ -0,0 +1,59 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict
+
+def estimate_tokens(text: str) -> int:
+    """Rough Claude token count, about 4 characters per token"""
+    return (len(text or "") + 3) // 4
+
+def fit_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text to the token budget at a line boundary"""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    return cut.rsplit("\n", 1)[0] if "\n" in cut else cut
+
+def text_key(text: str) -> str:
+    return hashlib.sha256((text or "").encode()).hexdigest()[:16]
+
+class PromptSegments:
+    """Memoized prompt pieces with their token budgets.
+
+    The course catalog and the per-document protocol text are rendered once
+    and reused by every analysis call for that document, so only the short
+    user segment is built per call.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._segments = OrderedDict()  # (kind, key) -> {text, tokens, truncated}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind: str, key: str, build: Callable[[], str], max_tokens: int) -> Dict:
+        with self._lock:
+            segment = self._segments.get((kind, key))
+            if segment is not None:
+                self._segments.move_to_end((kind, key))
+                self.hits += 1
+                return segment
+
+        text = build()
+        fitted = fit_tokens(text, max_tokens)
+        segment = {"text": fitted, "tokens": estimate_tokens(fitted), "truncated": len(fitted) < len(text)}
+        if segment["truncated"]:
+            print(f"Prompt segment {kind} cut to {max_tokens} tokens")
+
+        with self._lock:
+            self.misses += 1
+            self._segments[(kind, key)] = segment
+            while len(self._segments) > self.max_entries:
+                self._segments.popitem(last=False)
+        return segment
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {"segments": len(self._segments), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,181 @@
+import hashlib
+import re
+from typing import Dict, List
+
+HEADING_PATTERN = re.compile(
+    r"^\s*("
+    r"\d+(\.\d+)*[.)]?\s+[A-Z]"                                   # 1. Scope / 4.2 Shielding
+    r"|(SECTION|Section|PART|Part|CHAPTER|Chapter|APPENDIX|Appendix)\b"
+    r")"
+)
+
+def is_heading(line: str) -> bool:
+    """Numbered, keyword or short ALL-CAPS lines start a new section"""
+    stripped = line.strip()
+    if not stripped or len(stripped) > 100:
+        return False
+    if HEADING_PATTERN.match(stripped):
+        return True
+    letters = [c for c in stripped if c.isalpha()]
+    return len(letters) >= 4 and len(stripped) <= 80 and all(c.isupper() for c in letters)
+
+def split_sections(text: str) -> List[Dict]:
+    """Splits extracted PDF text into {"title", "text"} sections at heading lines"""
+    sections = []
+    current = {"title": "Introduction", "lines": []}
+    for line in (text or "").splitlines():
+        if is_heading(line) and current["lines"]:
+            sections.append(current)
+            current = {"title": line.strip(), "lines": []}
+        elif is_heading(line):
+            current["title"] = line.strip()
+        current["lines"].append(line)
+    sections.append(current)
+
+    result = []
+    for section in sections:
+        body = "\n".join(section["lines"]).strip()
+        if body:
+            result.append({"title": section["title"][:100], "text": body})
+    return result
+
+def _normalize(text: str) -> str:
+    # Whitespace and case changes from re-exporting are not edits
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def _section_hash(section_text: str) -> str:
+    return hashlib.sha256(_normalize(section_text).encode()).hexdigest()[:16]
+
+def section_hashes(text: str) -> List[Dict]:
+    """{"title", "hash"} per section"""
+    return [{"title": section["title"], "hash": _section_hash(section["text"])} for section in split_sections(text)]
+
+def diff_sections(old_sections: List[Dict], new_text: str) -> Dict:
+    """Section-level diff of a revision against the stored section hashes of the prior document"""
+    old_hashes = {s["hash"] for s in old_sections}
+    old_titles = {_normalize(s["title"]) for s in old_sections}
+    new_sections = split_sections(new_text)
+
+    changed, added, changed_text = [], [], []
+    unchanged = 0
+    for section in new_sections:
+        if _section_hash(section["text"]) in old_hashes:
+            unchanged += 1
+            continue
+        (changed if _normalize(section["title"]) in old_titles else added).append(section["title"])
+        changed_text.append(section["text"])
+
+    new_titles = {_normalize(s["title"]) for s in new_sections}
+    removed = [s["title"] for s in old_sections if _normalize(s["title"]) not in new_titles]
+    return {
+        "changed": changed,
+        "added": added,
+        "removed": removed,
+        "unchanged": unchanged,
+        "changed_text": "\n\n".join(changed_text)
+    }
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    """Splits an oversized section on paragraph, then line, then hard boundaries"""
+    if len(text) <= max_chars:
+        return [text]
+    for separator in ("\n\n", "\n", " "):
+        parts = text.split(separator)
+        if len(parts) > 1:
+            break
+    else:
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+    pieces, current = [], ""
+    for part in parts:
+        candidate = f"{current}{separator}{part}" if current else part
+        if len(candidate) <= max_chars:
+            current = candidate
+            continue
+        if current:
+            pieces.append(current)
+        if len(part) > max_chars:
+            pieces.extend(_split_long(part, max_chars))
+            current = ""
+        else:
+            current = part
+    if current:
+        pieces.append(current)
+    return pieces
+
+def chunk_protocol(text: str, max_chars: int = 6000) -> List[Dict]:
+    """Packs whole sections into chunks of at most max_chars, splitting only oversized ones"""
+    chunks = []
+    current = {"titles": [], "text": ""}
+
+    def flush():
+        if current["text"]:
+            chunks.append({"index": len(chunks), "titles": current["titles"], "text": current["text"]})
+
+    for section in split_sections(text):
+        for piece in _split_long(section["text"], max_chars):
+            if current["text"] and len(current["text"]) + len(piece) + 2 > max_chars:
+                flush()
+                current = {"titles": [], "text": ""}
+            current["text"] = f"{current['text']}\n\n{piece}" if current["text"] else piece
+            if section["title"] not in current["titles"]:
+                current["titles"].append(section["title"])
+    flush()
+    return chunks
+
+def _requirement_key(item) -> str:
+    return re.sub(r"\s+", " ", str(item)).strip().casefold()
+
+def _unique(items: List[str]) -> List[str]:
+    seen, result = set(), []
+    for item in items:
+        key = _requirement_key(item)
+        if key and key not in seen:
+            seen.add(key)
+            result.append(str(item).strip())
+    return result
+
+def merge_requirements(extractions: List[Dict], section_count: int, max_chars: int = 4000) -> Dict:
+    """Reduces per-chunk extractions into one compact requirement summary for the document"""
+    hazards = _unique([h for e in extractions for h in e.get("hazards", [])])
+    training = _unique([t for e in extractions for t in e.get("required_training", [])])
+    requirements = _unique([r for e in extractions for r in e.get("requirements", [])])
+
+    header = f"Document coverage: {section_count} sections in {len(extractions)} chunks"
+    return {
+        "text": format_requirements({"hazards": hazards, "required_training": training, "requirements": requirements}, header, max_chars),
+        "sections": section_count,
+        "chunks": len(extractions),
+        "hazards": hazards,
+        "required_training": training,
+        "requirements": requirements
+    }
+
+REQUIREMENT_KEYS = ("hazards", "required_training", "requirements")
+
+def format_requirements(requirements: Dict, header: str, max_chars: int = 4000) -> str:
+    """Prompt text for a requirement set, cut at a line boundary"""
+    lines = [header]
+    if requirements.get("hazards"):
+        lines.append("Hazards: " + "; ".join(requirements["hazards"]))
+    if requirements.get("required_training"):
+        lines.append("Required training: " + "; ".join(requirements["required_training"]))
+    if requirements.get("requirements"):
+        lines.append("Key requirements:")
+        lines.extend(f"- {r}" for r in requirements["requirements"])
+
+    text = "\n".join(lines)
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit("\n", 1)[0]
+    return text
+
+def requirement_delta(known: Dict, extracted: Dict) -> Dict:
+    """Items of extracted that are not already in known, per requirement kind"""
+    delta = {}
+    for key in REQUIREMENT_KEYS:
+        seen = {_requirement_key(item) for item in known.get(key, [])}
+        delta[key] = [item for item in _unique(extracted.get(key, [])) if _requirement_key(item) not in seen]
+    return delta
+
+def merge_requirement_sets(*sets: Dict) -> Dict:
+    return {key: _unique([item for s in sets for item in s.get(key, [])]) for key in REQUIREMENT_KEYS}
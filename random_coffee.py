@@ -1,14 +1,21 @@
 import json
+import threading
 import uuid
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
+from coffee_match_index import MatchIndex, MatchIndexMixin
+from coffee_matching import weekly_pairs
+from coffee_scoring import CompatibilityMatrix
 
-class RandomCoffeeManager:
+class RandomCoffeeManager(MatchIndexMixin):
     def __init__(self, data_file="coffee_profiles.json", matches_file="coffee_matches.json"):
         self.data_file = data_file
         self.matches_file = matches_file
         self.profiles = self.load_profiles()
         self.matches = self.load_matches()
+        self.match_index = MatchIndex()
+        self._index_matches()
+        self._create_lock = threading.Lock()  # matching runs in worker threads
     
     def load_profiles(self) -> Dict:
         try:
@@ -63,39 +70,38 @@ class RandomCoffeeManager:
         return False
     
     def create_weekly_matches(self) -> List[Dict]:
+        with self._create_lock:
+            return self._create_weekly_matches()
+    
+    def _create_weekly_matches(self) -> List[Dict]:
         active_profiles = [p for p in self.profiles.values() if p.get("active", False)]
         
         if len(active_profiles) < 2:
             return []
         
-        matches = []
-        used_users = set()
+        # Пары только там, где _can_match и еще не было матча; как можно больше людей с парой, затем максимальная совместимость
+        matrix = CompatibilityMatrix(active_profiles)
+        shared_interests = matrix.interests @ matrix.interests.T
+        can_match = (shared_interests > 0) | (matrix.departments[:, None] == matrix.departments[None, :])
+        for user1_id, user2_id in self.match_index.pairs:
+            i, j = matrix.index.get(user1_id), matrix.index.get(user2_id)
+            if i is not None and j is not None:
+                can_match[i, j] = can_match[j, i] = False
         
-        for i, profile1 in enumerate(active_profiles):
-            if profile1["user_id"] in used_users:
-                continue
-                
-            for profile2 in active_profiles[i+1:]:
-                if profile2["user_id"] in used_users:
-                    continue
-                
-                # Простой алгоритм матчинга
-                if self._can_match(profile1, profile2):
-                    match_id = str(uuid.uuid4())
-                    match = {
-                        "id": match_id,
-                        "users": [profile1["user_id"], profile2["user_id"]],
-                        "status": "active",
-                        "created_at": datetime.now().isoformat(),
-                        "confirmed_time": None,
-                        "feedback": []
-                    }
-                    
-                    self.matches[match_id] = match
-                    matches.append(match)
-                    used_users.add(profile1["user_id"])
-                    used_users.add(profile2["user_id"])
-                    break
+        matches = []
+        for i, j, _ in weekly_pairs(matrix.scores(), ~can_match, max_cardinality=True):
+            match_id = str(uuid.uuid4())
+            match = {
+                "id": match_id,
+                "users": [matrix.user_ids[i], matrix.user_ids[j]],
+                "status": "active",
+                "created_at": datetime.now().isoformat(),
+                "confirmed_time": None,
+                "feedback": []
+            }
+            
+            if self.add_match(match):
+                matches.append(match)
         
         self.save_matches()
         return matches
@@ -106,7 +112,7 @@ class RandomCoffeeManager:
         return len(common_interests) > 0 or profile1.get("department") == profile2.get("department")
     
     def get_user_matches(self, user_id: str) -> List[Dict]:
-        return [match for match in self.matches.values() if user_id in match["users"]]
+        return [self.matches[match_id] for match_id in self.match_index.user_match_ids(user_id)]
     
     def confirm_match(self, match_id: str, timeslot: str) -> bool:
         if match_id in self.matches:
@@ -0,0 +1,151 @@
+import json
+import numpy as np
+import pytest
+from coffee_candidates import CandidateIndex
+from coffee_match_index import MatchIndex, pair_key
+from coffee_matching import match_edges, weekly_pairs
+from coffee_scoring import CompatibilityMatrix, synthetic_profiles
+from enhanced_coffee import EnhancedCoffeeManager
+from random_coffee import RandomCoffeeManager
+
+def make_manager(tmp_path, profiles=(), matches=None):
+    if matches is not None:
+        (tmp_path / "matches.json").write_text(json.dumps(matches), encoding="utf-8")
+    manager = EnhancedCoffeeManager(str(tmp_path / "profiles.json"), str(tmp_path / "matches.json"))
+    manager.profiles = {p["user_id"]: p for p in profiles}
+    return manager
+
+def assert_one_to_one(pairs):
+    users = [u for i, j, _ in pairs for u in (i, j)]
+    assert len(users) == len(set(users))
+
+def test_matrix_matches_scalar_score(tmp_path):
+    profiles = synthetic_profiles(60, seed=3)
+    profiles[0]["department"] = None  # missing values compare equal, as in the scalar score
+    profiles[1]["department"] = None
+    profiles[2]["interests"] = []
+    manager = make_manager(tmp_path, profiles)
+    matrix = CompatibilityMatrix(profiles)
+    scores = matrix.scores(block_rows=7)
+
+    ids = matrix.user_ids
+    expected = np.array([[manager.calculate_compatibility_score(a, b)[0] for b in ids] for a in ids])
+    assert np.array_equal(scores, expected)
+
+    rows, cols = np.triu_indices(len(ids), 1)
+    assert np.array_equal(matrix.pair_scores(rows, cols), expected[rows, cols])
+
+@pytest.mark.parametrize("mode", ["optimal", "greedy"])
+def test_weekly_pairs_one_to_one_and_honors_exclusions(mode):
+    scores = CompatibilityMatrix(synthetic_profiles(40, seed=5)).scores()
+    excluded = np.zeros(scores.shape, dtype=bool)
+    best = weekly_pairs(scores, excluded, mode)
+    for i, j, _ in best[:5]:
+        excluded[i, j] = excluded[j, i] = True
+
+    pairs = weekly_pairs(scores, excluded, mode)
+    assert_one_to_one(pairs)
+    assert len(pairs) == 20
+    assert not any(excluded[i, j] for i, j, _ in pairs)
+    assert [p[2] for p in pairs] == sorted((p[2] for p in pairs), reverse=True)
+
+def test_weekly_pairs_limit_takes_heaviest_pairs():
+    scores = CompatibilityMatrix(synthetic_profiles(40, seed=5)).scores()
+    excluded = np.zeros(scores.shape, dtype=bool)
+    pairs = weekly_pairs(scores, excluded, limit=1)
+    off_diagonal = np.where(np.eye(len(scores), dtype=bool), -np.inf, scores)
+    assert len(pairs) == 1 and pairs[0][2] == off_diagonal.max()
+
+def test_candidate_edges_match_one_to_one():
+    index = CandidateIndex(synthetic_profiles(300, seed=9))
+    rows, cols, weights = index.top_partners(k=8)
+    assert np.all(rows < cols)
+    assert np.array_equal(weights, index.matrix.pair_scores(rows, cols))
+
+    pairs = match_edges(len(index.matrix), rows, cols, weights, mode="greedy")
+    assert_one_to_one(pairs)
+    edges = set(zip(rows.tolist(), cols.tolist()))
+    assert all((i, j) in edges for i, j, _ in pairs)
+
+def test_match_index_pairs_and_removal():
+    index = MatchIndex()
+    matches = {
+        "m1": {"id": "m1", "users": ["a", "b"], "created_at": "2025-01-01T10:00:00"},
+        "m2": {"id": "m2", "users": ["b", "a"], "created_at": "2025-01-02T10:00:00"},
+        "m3": {"id": "m3", "users": ["a", "c"], "created_at": "2025-01-03T10:00:00"},
+    }
+    assert index.rebuild(matches) == ["m2"]
+    assert pair_key("b", "a") == pair_key("a", "b")
+    assert index.has_pair("b", "a") and not index.has_pair("b", "c")
+    assert index.latest.day == 3
+
+    del matches["m2"]
+    removed = matches.pop("m3")
+    index.remove("m3", removed, matches)
+    assert not index.has_pair("a", "c")
+    assert index.latest.day == 1
+
+def test_manager_refuses_duplicate_pairs(tmp_path):
+    matches = {
+        "m1": {"id": "m1", "users": ["u1", "u2"], "created_at": "2025-01-01T10:00:00"},
+        "m2": {"id": "m2", "users": ["u2", "u1"], "created_at": "2025-01-02T10:00:00"},
+    }
+    manager = make_manager(tmp_path, matches=matches)
+    assert list(manager.matches) == ["m1"]
+
+    assert not manager.add_match({"id": "m3", "users": ["u2", "u1"], "created_at": "2025-01-03T10:00:00"})
+    assert manager.add_match({"id": "m4", "users": ["u1", "u3"], "created_at": "2025-01-04T10:00:00"})
+    assert manager.match_index.has_pair("u3", "u1")
+
+    assert manager.delete_match("m4")
+    assert not manager.match_index.has_pair("u3", "u1")
+    assert manager.remove_duplicate_matches() == ["m2"]
+
+def test_new_matches_skip_pairs_that_already_met(tmp_path):
+    profiles = synthetic_profiles(12, seed=1)
+    manager = make_manager(tmp_path, profiles)
+    first = manager.create_ai_matches(max_matches=6)
+    for match in manager.matches.values():
+        match["created_at"] = "2025-01-01T10:00:00"  # past the weekly limit
+    second = manager.create_ai_matches(max_matches=6)
+
+    met = {pair_key(*m["users"]) for m in first}
+    assert second and not any(pair_key(*m["users"]) in met for m in second)
+    assert len(manager.match_index.pairs) == len(manager.matches) == len(first) + len(second)
+
+def test_random_coffee_weekly_matches_do_not_repeat(tmp_path):
+    manager = RandomCoffeeManager(str(tmp_path / "profiles.json"), str(tmp_path / "matches.json"))
+    manager.profiles = {p["user_id"]: p for p in synthetic_profiles(20, seed=2)}
+    first = manager.create_weekly_matches()
+    second = manager.create_weekly_matches()
+
+    assert_one_to_one([(*m["users"], 0) for m in second])
+    assert not {pair_key(*m["users"]) for m in first} & {pair_key(*m["users"]) for m in second}
+
+def test_user_matches_follow_inserts_and_deletes(tmp_path):
+    index = MatchIndex()
+    matches = {
+        "m1": {"id": "m1", "users": ["a", "b"], "created_at": "2025-01-01T10:00:00"},
+        "m3": {"id": "m3", "users": ["a", "c"], "created_at": "2025-01-03T10:00:00"},
+    }
+    index.rebuild(matches)
+    assert index.user_match_ids("a") == ["m1", "m3"]
+    assert index.last_match_at["a"].day == 3
+    removed = matches.pop("m3")
+    index.remove("m3", removed, matches)
+    assert index.user_match_ids("a") == ["m1"] and index.user_match_ids("c") == []
+    assert index.last_match_at["a"].day == 1 and "c" not in index.last_match_at
+
+    manager = make_manager(tmp_path, matches={"m1": {"id": "m1", "users": ["u1", "u2"], "created_at": "2025-01-01T10:00:00"}})
+    assert manager.add_match({"id": "m4", "users": ["u1", "u3"], "created_at": "2025-01-04T10:00:00"})
+    assert [m["id"] for m in manager.get_user_matches("u1")] == ["m1", "m4"]
+    assert manager.delete_match("m4")
+    assert [m["id"] for m in manager.get_user_matches("u1")] == ["m1"]
+    assert manager.get_user_matches("u3") == []
+
+def test_random_coffee_user_matches(tmp_path):
+    manager = RandomCoffeeManager(str(tmp_path / "profiles.json"), str(tmp_path / "matches.json"))
+    manager.profiles = {p["user_id"]: p for p in synthetic_profiles(20, seed=2)}
+    for match in manager.create_weekly_matches():
+        for user_id in match["users"]:
+            assert match in manager.get_user_matches(user_id)
@@ -0,0 +1,66 @@
+import time
+import pytest
+from json_journal import JsonJournal
+
+def make_journal(tmp_path, **kwargs):
+    kwargs.setdefault("fsync_every", 100)
+    kwargs.setdefault("fsync_interval", 60)
+    kwargs.setdefault("compact_every", 1000)
+    return JsonJournal(str(tmp_path / "log.json"), **kwargs)
+
+def write_entries(journal, entries, start=0):
+    for seq in range(start, len(entries)):
+        journal.append(seq, entries[seq])
+
+def test_torn_tail_is_truncated(tmp_path):
+    journal = make_journal(tmp_path)
+    entries = [{"n": i} for i in range(5)]
+    write_entries(journal, entries)
+    journal.close()
+    with open(journal.journal_file, "a", encoding="utf-8") as f:
+        f.write('{"seq": 5, "entry": {"n"')
+
+    reopened = make_journal(tmp_path)
+    assert reopened.load() == entries
+    # New lines go after the last complete one, not after the garbage
+    reopened.append(5, {"n": 5})
+    reopened.close()
+    assert make_journal(tmp_path).load() == entries + [{"n": 5}]
+
+@pytest.mark.parametrize("crash_at", ["snapshot", "journal_rewrite"])
+def test_interrupted_compaction_replays_every_entry_once(tmp_path, monkeypatch, crash_at):
+    journal = make_journal(tmp_path)
+    entries = [{"n": i} for i in range(10)]
+    write_entries(journal, entries[:4])
+    journal.compact(entries[:4])
+    write_entries(journal, entries, start=4)
+
+    if crash_at == "snapshot":
+        monkeypatch.setattr("json_journal.os.replace", lambda *args: (_ for _ in ()).throw(OSError("crash")))
+    else:
+        monkeypatch.setattr(JsonJournal, "_rewrite_journal", lambda self, size: (_ for _ in ()).throw(OSError("crash")))
+    with pytest.raises(OSError):
+        journal.compact(entries)
+    monkeypatch.undo()
+
+    assert make_journal(tmp_path).load() == entries
+
+def test_appends_during_compaction_are_kept(tmp_path):
+    journal = make_journal(tmp_path)
+    entries = [{"n": i} for i in range(8)]
+    write_entries(journal, entries)
+    # Snapshot taken before the last three appends landed
+    journal.compact(entries[:5])
+    assert journal.journal_entries == 3
+    journal.close()
+
+    assert make_journal(tmp_path).load() == entries
+
+def test_pending_lines_are_fsynced_by_the_timer(tmp_path):
+    journal = make_journal(tmp_path, fsync_interval=0.05)
+    journal.append(0, {"n": 0})
+    assert journal._pending_fsync == 1
+
+    time.sleep(0.3)
+    assert journal._pending_fsync == 0
+    journal.close()
@@ -0,0 +1,79 @@
+import json
+from document_tracker import DocumentTracker
+from protocol_chunker import diff_sections, section_hashes
+
+SECTIONS = [
+    ("1. Scope", "This protocol applies to all personnel handling hazardous chemicals in teaching and research laboratories."),
+    ("2. Responsibilities", "Principal investigators ensure lab members complete chemical safety training before starting work."),
+    ("3. Personal Protective Equipment", "Wear safety glasses, a lab coat and nitrile gloves whenever chemicals are handled or stored."),
+    ("4. Spill Response", "Small spills are absorbed with the spill kit; large spills require evacuation and a call to EHS."),
+    ("5. Waste Disposal", "Label every waste container with its contents and request a pickup before it is three quarters full."),
+]
+
+def make_protocol(sections=SECTIONS, spacing=" "):
+    filler = spacing.join(["Review this section with every new lab member during onboarding."] * 4)
+    return "\n\n".join(f"{title}\n{spacing.join(body.split(' '))}{spacing}{filler}" for title, body in sections)
+
+def make_tracker(tmp_path):
+    return DocumentTracker(data_dir=str(tmp_path / "tracker"), legacy_file=str(tmp_path / "missing.json"))
+
+def test_exact_duplicate(tmp_path):
+    tracker = make_tracker(tmp_path)
+    text = make_protocol()
+    tracker.save_document(text, [])
+
+    is_duplicate, _ = tracker.is_duplicate(text)
+    assert is_duplicate
+
+def test_reexport_is_near_duplicate(tmp_path):
+    tracker = make_tracker(tmp_path)
+    tracker.save_document(make_protocol(), [])
+    reexported = make_protocol(spacing="  ").replace("1. Scope", "1.  Scope")
+
+    assert not tracker.is_duplicate(reexported)[0]
+    revision = tracker.find_revision(reexported)
+    assert revision is not None
+    diff = revision["diff"]
+    assert diff["changed"] == [] and diff["added"] == [] and diff["removed"] == []
+    assert diff["unchanged"] == len(SECTIONS)
+
+def test_revision_past_first_1000_chars_is_diffed(tmp_path):
+    tracker = make_tracker(tmp_path)
+    original = make_protocol()
+    original_hash = tracker.save_document(original, [])
+    edited = list(SECTIONS)
+    edited[3] = (edited[3][0], edited[3][1] + " Report every spill to the lab supervisor within one hour.")
+    revised = make_protocol(edited)
+    assert revised[:1000] == original[:1000]
+
+    assert not tracker.is_duplicate(revised)[0]
+    revision = tracker.find_revision(revised)
+    assert revision["document_hash"] == original_hash
+    assert revision["diff"]["changed"] == ["4. Spill Response"]
+    assert revision["diff"]["added"] == [] and revision["diff"]["removed"] == []
+
+    # The revision gets its own entry instead of overwriting the original
+    revised_hash = tracker.save_document(revised, [], revision_of=original_hash)
+    assert revised_hash != original_hash
+    assert set(tracker.processed_docs) == {original_hash, revised_hash}
+
+def test_diff_normalizes_title_spacing():
+    old = section_hashes(make_protocol())
+    edited = [(title.replace(" ", "   "), body) for title, body in SECTIONS]
+    edited[2] = (edited[2][0], "Face shields are required in addition to safety glasses when pouring acids.")
+    diff = diff_sections(old, make_protocol(edited, spacing="\n"))
+
+    assert diff["changed"] == ["3.   Personal   Protective   Equipment"]
+    assert diff["added"] == [] and diff["removed"] == []
+
+def test_legacy_document_without_text_is_still_a_duplicate(tmp_path):
+    text = make_protocol()
+    legacy_file = tmp_path / "tracker_data.json"
+    legacy_file.write_text(json.dumps({"processed_docs": {DocumentTracker.get_legacy_hash(text): {
+        "processed_at": "2025-01-01T10:00:00", "title": text[:100], "assignments_count": 0, "assigned_users": []
+    }}, "assignment_history": {}}), encoding="utf-8")
+    tracker = DocumentTracker(data_dir=str(tmp_path / "tracker"), legacy_file=str(legacy_file))
+
+    assert tracker.find_duplicate(text) == DocumentTracker.get_legacy_hash(text)
+    # Without stored text only the prefix key is known, so legacy entries match as they did before
+    assert tracker.find_duplicate(text + "\n\n6. Appendix\nNew section.") == DocumentTracker.get_legacy_hash(text)
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+class TrackerStore:
+    """File layout behind DocumentTracker.
+
+    data/tracker/
+        documents.json           metadata of every processed document (small, loaded at startup)
+        blobs/<sha256>.txt       full protocol text, stored once per content hash
+        sections/<doc_hash>.json section hashes of a document
+        assignments/<user>.jsonl append-only assignment records of one user
+    """
+
+    def __init__(self, data_dir: str = "data/tracker"):
+        self.data_dir = data_dir
+        self.documents_file = os.path.join(data_dir, "documents.json")
+        for sub in ("blobs", "sections", "assignments"):
+            os.makedirs(os.path.join(data_dir, sub), exist_ok=True)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.documents_file)
+
+    def load_documents(self) -> Dict:
+        if not self.exists():
+            return {}
+        with open(self.documents_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_documents(self, documents: Dict):
+        """Metadata only, so the rewrite stays small however much text is stored"""
+        self._write_atomic(self.documents_file, json.dumps(documents, ensure_ascii=False))
+
+    def write_blob(self, text: str) -> str:
+        content_hash = hashlib.sha256(text.encode()).hexdigest()
+        path = self._blob_path(content_hash)
+        if not os.path.exists(path):
+            self._write_atomic(path, text)
+        return content_hash
+
+    def read_blob(self, content_hash: str) -> Optional[str]:
+        path = self._blob_path(content_hash)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def write_sections(self, doc_hash: str, sections: List[Dict]):
+        self._write_atomic(os.path.join(self.data_dir, "sections", f"{doc_hash}.json"), json.dumps(sections, ensure_ascii=False))
+
+    def read_sections(self, doc_hash: str) -> Optional[List[Dict]]:
+        path = os.path.join(self.data_dir, "sections", f"{doc_hash}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def append_assignment(self, user_id: str, record: Dict):
+        with open(self._assignments_path(user_id), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"user_id": user_id, **record}, ensure_ascii=False) + "\n")
+
+    def read_assignments(self, user_id: str) -> List[Dict]:
+        path = self._assignments_path(user_id)
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                # A torn last line from a crash is skipped
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                record.pop("user_id", None)
+                records.append(record)
+        return records
+
+    def list_users(self) -> List[str]:
+        """User ids with assignment records (read from the records, file names are sanitized)"""
+        users = []
+        directory = os.path.join(self.data_dir, "assignments")
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".jsonl"):
+                with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                    first_line = f.readline()
+                try:
+                    users.append(json.loads(first_line)["user_id"])
+                except (json.JSONDecodeError, KeyError):
+                    continue
+        return users
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.data_dir, "blobs", f"{content_hash}.txt")
+
+    def _assignments_path(self, user_id: str) -> str:
+        return os.path.join(self.data_dir, "assignments", re.sub(r"[^A-Za-z0-9_.-]", "_", user_id) + ".jsonl")
+
+    def _write_atomic(self, path: str, content: str):
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(f"{path}.tmp", path)
@@ -891,7 +891,7 @@ def generate_user_dashboard_html(user_data, assignments, scheduler, course_compl
             # Находим дату завершения
             completion_info = None
             if course_completion:
-                completion_info = next((c for c in course_completion.completions if c["user_id"] == user["user_id"] and c["course_id"] == course_id), None)
+                completion_info = course_completion.get_completion(user["user_id"], course_id)
             completed_date = "N/A"
             if completion_info:
                 completed_date = datetime.fromisoformat(completion_info["completed_at"]).strftime("%d.%m.%Y")
@@ -1133,19 +1133,50 @@ def generate_user_dashboard_html(user_data, assignments, scheduler, course_compl
                 const formData = new FormData();
                 formData.append('user_id', userId);
                 formData.append('message', message);
+                formData.append('stream', 'true');
                 
                 const response = await fetch('/coffee/chat', {
                     method: 'POST',
                     body: formData
                 });
                 
-                const data = await response.json();
-                
                 document.getElementById('coffeeLoading').remove();
                 
-                const botResponse = formatChatMessage(data.response);
-                messagesDiv.innerHTML += `<div style="margin: 8px 0;"><div style="background: white; border: 1px solid #dee2e6; padding: 8px 12px; border-radius: 12px; display: inline-block; max-width: 80%; line-height: 1.5;">☕ ${botResponse}</div></div>`;
-                messagesDiv.scrollTop = messagesDiv.scrollHeight;
+                // AI replies arrive as server-sent events, canned replies as plain JSON
+                if ((response.headers.get('content-type') || '').includes('text/event-stream')) {
+                    const bubbleId = `coffeeStream${Date.now()}`;
+                    messagesDiv.innerHTML += `<div style="margin: 8px 0;"><div id="${bubbleId}" style="background: white; border: 1px solid #dee2e6; padding: 8px 12px; border-radius: 12px; display: inline-block; max-width: 80%; line-height: 1.5;">☕ </div></div>`;
+                    const bubble = document.getElementById(bubbleId);
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+                    let replyText = '';
+                    
+                    while (true) {
+                        const { done, value } = await reader.read();
+                        if (done) break;
+                        
+                        buffer += decoder.decode(value, { stream: true });
+                        const events = buffer.split('\n\n');
+                        buffer = events.pop();
+                        
+                        for (const event of events) {
+                            if (!event.startsWith('data: ')) continue;
+                            const data = JSON.parse(event.slice(6));
+                            if (data.type === 'token') {
+                                replyText += data.text;
+                                bubble.innerHTML = `☕ ${formatChatMessage(replyText)}`;
+                                messagesDiv.scrollTop = messagesDiv.scrollHeight;
+                            }
+                        }
+                    }
+                } else {
+                    const data = await response.json();
+                    
+                    const botResponse = formatChatMessage(data.response);
+                    messagesDiv.innerHTML += `<div style="margin: 8px 0;"><div style="background: white; border: 1px solid #dee2e6; padding: 8px 12px; border-radius: 12px; display: inline-block; max-width: 80%; line-height: 1.5;">☕ ${botResponse}</div></div>`;
+                    messagesDiv.scrollTop = messagesDiv.scrollHeight;
+                }
                 
                 // Показываем матчи если пользователь спросил
                 if (message.toLowerCase().includes('матч') || message.toLowerCase().includes('matches')) {
@@ -1156,7 +1187,7 @@ def generate_user_dashboard_html(user_data, assignments, scheduler, course_compl
                 setTimeout(checkNewMessages, 1000);
                 
             } catch (error) {
-                document.getElementById('coffeeLoading').remove();
+                document.getElementById('coffeeLoading')?.remove();
                 messagesDiv.innerHTML += `<div style="margin: 8px 0;"><div style="background: #f8d7da; border: 1px solid #f5c6cb; color: #721c24; padding: 8px 12px; border-radius: 12px; display: inline-block;">❌ Error: ${error.message}</div></div>`;
                 messagesDiv.scrollTop = messagesDiv.scrollHeight;
             }